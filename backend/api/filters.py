@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, MealPlan, Recipe, Tag
+from recipes.tagmask import filter_any
 
 User = get_user_model()
 
@@ -14,8 +15,20 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
 
+class TagsFilter(filters.ModelMultipleChoiceFilter):
+    """
+    Рецепты хотя бы с одним из тегов по маске Recipe.tag_mask, без
+    соединения с таблицей тегов (см. recipes/tagmask.py).
+    """
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return filter_any(qs, value)
+
+
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
+    tags = TagsFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
@@ -40,3 +53,12 @@ class RecipeFilter(FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+
+class MealPlanFilter(FilterSet):
+    start = filters.DateFilter(field_name='date', lookup_expr='gte')
+    end = filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = MealPlan
+        fields = ('start', 'end')
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.sse import EVENTS_PATH, events_application, registry
+from foodgram.pubsub import hub
+
+RECIPE_ID = 1
+
+
+class Client:
+    """
+    Соединение SSE без сети: ASGI-приложение вызывается напрямую, как
+    его вызывает воркер uvicorn. Медленный клиент (slow) не принимает
+    данные после заголовков — send() зависает, как при заполненном
+    буфере сокета.
+    """
+
+    def __init__(self, slow=False):
+        self.slow = slow
+        self.disconnected = asyncio.Event()
+        self.delivered = None
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        body = message.get('body', b'')
+        if body.startswith(b'event:') and self.delivered is not None:
+            self.delivered()
+        if self.slow and message['type'] == 'http.response.body':
+            await asyncio.Event().wait()
+
+    def run(self):
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': EVENTS_PATH,
+            'query_string': f'recipes={RECIPE_ID}'.encode(),
+            'headers': [],
+        }
+        return asyncio.ensure_future(
+            events_application(scope, self.receive, self.send)
+        )
+
+
+class Command(BaseCommand):
+    help = ('Сколько стоят простаивающие соединения SSE в одном воркере: '
+            'память на соединение и время рассылки события всем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000)
+        parser.add_argument('--events', type=int, default=20)
+        parser.add_argument('--slow', type=int, default=0,
+                            help='Сколько клиентов не читают поток.')
+
+    def handle(self, *args, **options):
+        with override_settings(EVENTS_BROKER='local',
+                               EVENTS_HEARTBEAT_SECONDS=1,
+                               EVENTS_MAX_CONNECTIONS=10 ** 9):
+            asyncio.run(self.bench(**options))
+
+    async def bench(self, connections, events, slow, **options):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        clients = [Client() for _ in range(connections)]
+        clients += [Client(slow=True) for _ in range(slow)]
+        tasks = [client.run() for client in clients]
+        while len(registry) < len(clients):
+            await asyncio.sleep(0)
+        connect_time = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        self.stdout.write(
+            f'Соединений: {len(registry)}, открыты за {connect_time:.2f} с, '
+            f'память: {memory / len(clients) / 1024:.1f} КБ на соединение'
+        )
+
+        latencies = []
+        for number in range(events):
+            remaining = connections
+            done = asyncio.Event()
+
+            def delivered():
+                nonlocal remaining
+                remaining -= 1
+                if not remaining:
+                    done.set()
+
+            for client in clients:
+                client.delivered = delivered
+            payload = json.dumps({
+                'type': 'counts', 'recipe': RECIPE_ID,
+                'favorites': number, 'shopping_carts': 0,
+            })
+            started = time.perf_counter()
+            hub.dispatch(payload)
+            await done.wait()
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        if latencies:
+            self.stdout.write(
+                f'Рассылка события всем: медиана '
+                f'{latencies[len(latencies) // 2] * 1000:.1f} мс, '
+                f'максимум {latencies[-1] * 1000:.1f} мс'
+            )
+        if slow:
+            queued = max((
+                connection.queue.qsize() for connection in registry.connections
+            ), default=0)
+            # Зависшие клиенты отключаются по тайм-ауту отправки.
+            await asyncio.sleep(1.5)
+            self.stdout.write(
+                f'Не читающих клиентов: {slow}, максимальная очередь: '
+                f'{queued}, отключено: {len(clients) - len(registry)}'
+            )
+
+        for client in clients:
+            client.disconnected.set()
+        await asyncio.gather(*tasks)
+        self.stdout.write(self.style.SUCCESS(
+            f'Закрыто, осталось соединений: {len(registry)}'
+        ))
@@ -0,0 +1,78 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+FIELD_SETS = (
+    ('полный ответ', ''),
+    ('карточка', 'fields=id,name,image,cooking_time'),
+    ('карточка + автор', 'fields=id,name,image,cooking_time,author'),
+    ('карточка + автор целиком',
+     'fields=id,name,image,cooking_time,author&expand=author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Размер ответа и время сериализации страницы рецептов '
+            'для разных значений ?fields= и ?expand=. Тестовые данные '
+            'удаляются откатом транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.create_recipes(options['recipes'])
+            view = RecipeViewSet.as_view({'get': 'list'})
+            factory = APIRequestFactory()
+            for title, query in FIELD_SETS:
+                url = f'/api/recipes/?limit={options["page_size"]}&{query}'
+                request = factory.get(url)
+                force_authenticate(request, user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = view(request).render()
+                started = perf_counter()
+                for _ in range(options['repeat']):
+                    view(request).render()
+                elapsed = (perf_counter() - started) / options['repeat']
+                self.stdout.write(
+                    f'{title:<26} {len(response.content):>7} байт '
+                    f'{len(queries):>3} запросов {elapsed * 1000:.2f} мс'
+                )
+            transaction.set_rollback(True)
+
+    def create_recipes(self, count):
+        user = User.objects.create(username='bench_fields',
+                                   email='bench_fields@example.com')
+        tags = [
+            Tag.objects.create(name=f'bench_{i}', color=f'#00000{i}',
+                               slug=f'bench_{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'bench_{i}', measurement_unit='г')
+            for i in range(10)
+        ]
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=user, name=f'Рецепт {i}',
+                image='recipes/images/bench.png', text='Текст ' * 500,
+                cooking_time=10,
+            )
+            recipe.tags.set(tags)
+            AmountIngredient.objects.bulk_create(
+                AmountIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=100)
+                for ingredient in ingredients
+            )
+        return user
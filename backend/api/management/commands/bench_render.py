@@ -0,0 +1,82 @@
+import gzip
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.middleware import COMPRESSORS
+from api.renderers import ORJSONRenderer, orjson
+
+
+def recipe_page(size):
+    """
+    Страница рецептов в форме ответа RecipeSerializer.
+    """
+    author = {
+        'email': 'author@example.com', 'id': 1, 'username': 'author',
+        'first_name': 'Имя', 'last_name': 'Фамилия', 'is_subscribed': True,
+    }
+    tags = [
+        {'id': i, 'name': f'Тег {i}', 'color': '#E26C2D', 'slug': f'tag{i}'}
+        for i in range(3)
+    ]
+    return {
+        'count': size,
+        'next': None,
+        'previous': None,
+        'results': [{
+            'id': i,
+            'tags': tags,
+            'author': author,
+            'ingredients': [
+                {'id': j, 'name': f'Ингредиент {j}', 'amount': 100,
+                 'measurement_unit': 'г'}
+                for j in range(10)
+            ],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': f'Рецепт {i}',
+            'image': f'http://localhost/media/recipes/images/{i}.png',
+            'text': 'Описание приготовления. ' * 40,
+            'cooking_time': 30,
+        } for i in range(size)],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Время рендеринга и сжатия страницы из 200 рецептов '
+            'стандартным рендерером DRF и ORJSONRenderer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        data = recipe_page(options['recipes'])
+        repeat = options['repeat']
+        if orjson is None:
+            self.stdout.write('orjson не установлен, ORJSONRenderer '
+                              'использует стандартный рендерер.')
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            content = renderer.render(data)
+            elapsed = self.measure(lambda: renderer.render(data), repeat)
+            self.stdout.write(
+                f'{type(renderer).__name__:<16} {len(content):>8} байт '
+                f'{elapsed * 1000:.2f} мс'
+            )
+        for encoding, compress in COMPRESSORS.items():
+            compressed = compress(content)
+            elapsed = self.measure(lambda: compress(content), repeat)
+            self.stdout.write(
+                f'{encoding:<16} {len(compressed):>8} байт '
+                f'{elapsed * 1000:.2f} мс '
+                f'(в {len(content) / len(compressed):.1f} раз меньше)'
+            )
+        assert gzip.decompress(COMPRESSORS['gzip'](content)) == content
+
+    @staticmethod
+    def measure(func, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            func()
+        return (perf_counter() - started) / repeat
@@ -0,0 +1,72 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Время холодного старта gunicorn с gunicorn.conf.py '
+            'до первого ответа 200.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--path', default='/api/tags/')
+        parser.add_argument('--workers', default='1')
+        parser.add_argument('--worker-class', default='gthread')
+        parser.add_argument('--timeout', type=float, default=60)
+
+    def handle(self, *args, **options):
+        results = [self.run_once(options) for _ in range(options['runs'])]
+        self.stdout.write(
+            f'Холодный старт до первого 200: '
+            f'мин. {min(results):.2f} с, макс. {max(results):.2f} с, '
+            f'среднее {sum(results) / len(results):.2f} с'
+        )
+
+    def run_once(self, options):
+        port = free_port()
+        env = {
+            **os.environ,
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'GUNICORN_WORKERS': options['workers'],
+            'GUNICORN_WORKER_CLASS': options['worker_class'],
+        }
+        url = f'http://127.0.0.1:{port}{options["path"]}'
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--access-logfile', '/dev/null'],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - started < options['timeout']:
+                try:
+                    with urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            elapsed = time.perf_counter() - started
+                            self.stdout.write(f'  {elapsed:.2f} с')
+                            return elapsed
+                except (URLError, ConnectionError, socket.timeout):
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError('gunicorn завершился при запуске.')
+                time.sleep(0.02)
+            raise RuntimeError('gunicorn не ответил за отведённое время.')
+        finally:
+            process.terminate()
+            process.wait()
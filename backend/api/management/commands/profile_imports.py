@@ -0,0 +1,109 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+STARTUP_SCRIPT = '''
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+resolver = get_resolver()
+resolver.url_patterns
+resolver.reverse_dict
+print(time.perf_counter() - started)
+'''
+
+IMPORT_TIME_RE = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$'
+)
+
+
+def run_startup(*options):
+    """
+    Запуск django.setup() и построения URL-резолвера в новом процессе.
+    """
+    result = subprocess.run(
+        [sys.executable, *options, '-c', STARTUP_SCRIPT],
+        cwd=settings.BASE_DIR,
+        env={
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+            ),
+        },
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise CommandError(result.stderr)
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_import_time(output):
+    """
+    Разбор вывода python -X importtime: (модуль, собственное время,
+    суммарное время, глубина вложенности), время в микросекундах.
+    """
+    modules = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append(
+                (name, int(self_us), int(cumulative_us), len(indent) // 2)
+            )
+    return modules
+
+
+class Command(BaseCommand):
+    help = ('Отчёт о времени импорта модулей при запуске Django '
+            '(python -X importtime) и проверка бюджета времени на '
+            'django.setup() с построением URL-резолвера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Завершиться с ошибкой, если медиана '
+                                 'времени запуска больше бюджета.')
+
+    def handle(self, *args, **options):
+        _, output = run_startup('-X', 'importtime')
+        modules = parse_import_time(output)
+        top = options['top']
+
+        self.stdout.write('Самые долгие импорты верхнего уровня '
+                          '(суммарное время, мс):')
+        roots = sorted((m for m in modules if m[3] == 0),
+                       key=lambda m: m[2], reverse=True)
+        for name, _, cumulative_us, _ in roots[:top]:
+            self.stdout.write(f'  {cumulative_us / 1000:>8.1f}  {name}')
+
+        self.stdout.write('Собственное время импорта по пакетам (мс):')
+        packages = defaultdict(int)
+        for name, self_us, _, _ in modules:
+            packages[name.split('.')[0]] += self_us
+        for package, self_us in sorted(
+            packages.items(), key=lambda item: item[1], reverse=True
+        )[:top]:
+            self.stdout.write(f'  {self_us / 1000:>8.1f}  {package}')
+
+        timings = [run_startup()[0] for _ in range(options['runs'])]
+        median_ms = statistics.median(timings) * 1000
+        self.stdout.write(
+            f'django.setup() и URL-резолвер: медиана {median_ms:.0f} мс '
+            f'за {options["runs"]} запусков'
+        )
+        budget = options['budget_ms']
+        if budget is not None and median_ms > budget:
+            raise CommandError(
+                f'Время запуска {median_ms:.0f} мс больше бюджета '
+                f'{budget:.0f} мс.'
+            )
@@ -0,0 +1,176 @@
+import re
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from foodgram import metrics
+
+from .profiling import capture, requested_profiler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ACCEPT_ENCODING_RE = re.compile(r'([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+
+
+def brotli_compress(content):
+    return brotli.compress(
+        content, quality=getattr(settings, 'BROTLI_QUALITY', 4)
+    )
+
+
+COMPRESSORS = {'gzip': compress_string}
+if brotli is not None:
+    COMPRESSORS['br'] = brotli_compress
+
+# Порядок предпочтения при одинаковом q.
+PREFERENCE = ('br', 'gzip')
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Выбор кодировки сжатия по заголовку Accept-Encoding с учётом q.
+    """
+    weights = {}
+    for name, quality in ACCEPT_ENCODING_RE.findall(accept_encoding.lower()):
+        try:
+            weights[name] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    best, best_weight = None, 0.0
+    for name in PREFERENCE:
+        if name not in COMPRESSORS:
+            continue
+        weight = weights.get(name, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжатие ответов gzip или brotli в зависимости от Accept-Encoding.
+    Сжимаются только обычные (не потоковые) ответы не меньше
+    COMPRESSION_MIN_SIZE байт.
+    """
+
+    def process_response(self, request, response):
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or len(response.content)
+                < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+
+        compressed = COMPRESSORS[encoding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        # Сжатое представление отличается побайтно от исходного.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+def is_staff(request):
+    """
+    Сотрудник ли автор запроса: по сессии (админка) или по токену API.
+    """
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+class ProfilingMiddleware:
+    """
+    Профиль запроса по требованию сотрудника (см. api/profiling.py).
+    Запросы без заголовка X-Profile и параметра ?_profile= проходят без
+    проверок; при PROFILING_ENABLED=False middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_profiler(request)
+        if mode is None or not is_staff(request):
+            return self.get_response(request)
+        return capture(mode, request, self.get_response)
+
+
+class QueryTimer:
+    """
+    Обёртка выполнения SQL (connection.execute_wrapper): число и время
+    запросов к базе.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Метрики запроса по имени маршрута (foodgram/metrics.py): статус,
+    время ответа, число и время запросов к базе. Стоит первым в
+    MIDDLEWARE, чтобы учитывать время всех остальных.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryTimer()
+        started = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = perf_counter() - started
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        metrics.REQUESTS.inc(
+            route=route, method=request.method, status=response.status_code
+        )
+        metrics.REQUEST_SECONDS.observe(
+            elapsed, route=route, method=request.method
+        )
+        metrics.DB_QUERIES.observe(queries.count, route=route)
+        metrics.DB_SECONDS.inc(queries.seconds, route=route)
+        return response
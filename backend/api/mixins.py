@@ -0,0 +1,197 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.db_router import (
+    pin_primary,
+    reset_read_routing,
+    route_reads_to_replica,
+)
+from foodgram.metrics import SERIALIZER_SECONDS
+from users.models import Subscriptions
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def parse_fields(request):
+    """
+    Разбор параметров ?fields= и ?expand= запроса.
+    Возвращает набор запрошенных полей (None — все поля) и набор
+    вложенных объектов, которые нужно отдать целиком.
+    """
+    if request is None:
+        return None, set()
+    params = request.query_params
+    fields = params.get(FIELDS_PARAM)
+    return (
+        _split(fields) if fields else None,
+        _split(params.get(EXPAND_PARAM, '')),
+    )
+
+
+def is_requested(request, name, expanded=False):
+    """
+    Нужно ли поле name в ответе. При expanded=True поле должно
+    отдаваться вложенным объектом, а не первичным ключом.
+    """
+    fields, expand = parse_fields(request)
+    if fields is None:
+        return True
+    return name in fields and (not expanded or name in expand)
+
+
+def followed_authors(request):
+    """
+    id авторов, на которых подписан пользователь запроса. Загружаются
+    одним запросом при первом обращении и хранятся в запросе: поле
+    is_subscribed всех сериализаторов ответа (пользователи, авторы
+    рецептов, подписки) больше не обращается к базе.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return frozenset()
+    cached = getattr(request, '_followed_authors', None)
+    if cached is None or cached[0] != user.pk:
+        cached = user.pk, frozenset(Subscriptions.objects.filter(
+            user=user
+        ).values_list('author_id', flat=True))
+        request._followed_authors = cached
+    return cached[1]
+
+
+class SparseFieldsMixin:
+    """
+    Ограничение набора полей сериализатора параметрами запроса.
+
+    ?fields=id,name,image — вернуть только перечисленные поля;
+    ?expand=author,tags — вложенные объекты из fields отдавать целиком,
+    иначе они заменяются первичными ключами (см. compact_fields).
+    Без параметра fields ответ не меняется.
+    Поля убираются до сериализации, поэтому их SerializerMethodField
+    и связанные запросы не выполняются.
+    """
+    compact_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = parse_fields(self.context.get('request'))
+        if fields is None:
+            return
+        for name in set(self.fields) - fields:
+            self.fields.pop(name)
+        for name, compact_field in self.compact_fields.items():
+            if name in self.fields and name not in expand:
+                self.fields[name] = compact_field()
+
+
+def compact_pk(many=False):
+    """
+    Компактное представление вложенного объекта первичным ключом.
+    """
+    return lambda: serializers.PrimaryKeyRelatedField(
+        many=many, read_only=True
+    )
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """
+    Список, сериализация которого учитывается в метриках, если это
+    ответ целиком, а не вложенное поле.
+    """
+
+    def to_representation(self, data):
+        if self.parent is not None:
+            return super().to_representation(data)
+        with SERIALIZER_SECONDS.time(serializer=type(self.child).__name__):
+            return super().to_representation(data)
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы к действиям из replica_actions читаются из реплик.
+    Успешная запись закрепляет пользователя за основной базой, чтобы он
+    сразу видел свои изменения.
+    """
+    replica_actions = ('list', 'retrieve')
+    replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method in SAFE_METHODS
+                and self.action in self.replica_actions):
+            self.replica_token = route_reads_to_replica(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        reset_read_routing(self.replica_token)
+        self.replica_token = None
+        if response.status_code < 400 and request.method not in SAFE_METHODS:
+            pin_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ConditionalRetrieveMixin:
+    """
+    Условный GET для retrieve. Состояние объекта для ETag (и дата для
+    Last-Modified) получается одним запросом в get_validators() до
+    сериализации; если клиент прислал совпадающий валидатор, отдаётся
+    304 без сериализации (после проверки доступа к объекту).
+    Анонимные ответы можно кэшировать публично, ответы пользователю
+    зависят от его подписок и избранного, поэтому только приватно.
+    """
+
+    def get_validators(self):
+        """
+        Возвращает (состояние, дата изменения или None) либо None,
+        если объекта нет.
+        """
+        raise NotImplementedError
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            validators = self.get_validators()
+        except (ValueError, TypeError):
+            validators = None
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        state, last_modified = validators
+        user = request.user
+        etag = quote_etag(md5(repr(
+            (state, user.pk, request.query_params.urlencode())
+        ).encode()).hexdigest())
+        timestamp = None
+        if last_modified is not None and not user.is_authenticated:
+            timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        else:
+            # 304 получает только тот, кому доступен сам объект: фильтры
+            # queryset и права на объект проверяются, как в retrieve.
+            self.get_object()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        if user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True,
+                max_age=getattr(settings, 'PUBLIC_CACHE_SECONDS', 60),
+            )
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,77 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.feed import get_feed_page
+
+
+class FeedPagination(BasePagination):
+    """
+    Keyset-пагинация ленты подписок по курсору (pub_date, id).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                encoded.encode('ascii')
+            ).decode('ascii').split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        pub_date, pk = cursor
+        encoded = urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode('ascii')
+        ).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def paginate_feed(self, request, user, strategy=None, queryset=None):
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.cursor_query_param
+        )
+        recipes, next_cursor = get_feed_page(
+            user,
+            cursor=self.decode_cursor(request),
+            limit=self.get_page_size(request),
+            strategy=strategy,
+            queryset=queryset,
+        )
+        self.next_cursor = next_cursor
+        return recipes
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return self.encode_cursor(self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
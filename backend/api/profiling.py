@@ -0,0 +1,251 @@
+"""
+Профилирование отдельных запросов по требованию (api.middleware.
+ProfilingMiddleware).
+
+Профиль снимается, только если сотрудник (is_staff) передал заголовок
+X-Profile или параметр ?_profile= со значением:
+    cprofile — детерминированный профиль cProfile, файл .prof для
+               pstats, snakeviz и т. п.;
+    sample   — выборка стека потока запроса раз в
+               PROFILING_INTERVAL_MS мс, файл в формате speedscope
+               (https://www.speedscope.app). Почти не замедляет запрос,
+               поэтому подходит для медленных запросов в продакшене.
+
+В процессе одновременно снимается один профиль: cProfile не допускает
+двух активных профилировщиков, а Sampler меняет общий для процесса
+интервал переключения потоков. Запрос профиля, пока идёт другой,
+получает 409.
+
+Профили хранятся кольцом в PROFILING_DIR (общем для воркеров): при
+сохранении удаляются самые старые сверх PROFILING_KEEP. Id профиля
+возвращается в заголовке X-Profile-Id, скачать его можно через
+/api/profiles/<id>/.
+"""
+import cProfile
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.http import JsonResponse
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+PROFILE_ID_RE = r'\d{20}-[0-9a-f]{8}'
+META_SUFFIX = '.meta.json'
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+# Занят, пока в процессе снимается профиль.
+_active = threading.Lock()
+
+
+class Sampler:
+    """
+    Выборочный профиль одного потока: отдельный поток раз в interval
+    секунд снимает стек профилируемого потока. Чтобы получить GIL
+    вовремя, на время профиля интервал переключения потоков
+    уменьшается до interval.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.frames = {}
+        self.samples = []
+        self.weights = []
+        self.thread_id = None
+        self.switch_interval = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def enable(self):
+        self.thread_id = threading.get_ident()
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.interval, self.switch_interval))
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+        sys.setswitchinterval(self.switch_interval)
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.record(frame, now - last)
+            last = now
+
+    def record(self, frame, weight):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = code.co_name, code.co_filename, code.co_firstlineno
+            stack.append(self.frames.setdefault(key, len(self.frames)))
+            frame = frame.f_back
+        stack.reverse()
+        self.samples.append(stack)
+        self.weights.append(weight)
+
+    def speedscope(self, name):
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'foodgram',
+            'shared': {'frames': [
+                {'name': function, 'file': filename, 'line': line}
+                for function, filename, line in self.frames
+            ]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+def write_cprofile(profiler, path, name):
+    profiler.dump_stats(path)
+
+
+def write_speedscope(profiler, path, name):
+    with open(path, 'w') as file:
+        json.dump(profiler.speedscope(name), file)
+
+
+# Профилировщик: (фабрика, запись в файл, расширение файла).
+PROFILERS = {
+    'cprofile': (cProfile.Profile, write_cprofile, '.prof'),
+    'sample': (
+        lambda: Sampler(settings.PROFILING_INTERVAL_MS / 1000),
+        write_speedscope,
+        '.speedscope.json',
+    ),
+}
+
+
+def requested_profiler(request):
+    """
+    Профилировщик, запрошенный заголовком или параметром, или None.
+    Строка запроса разбирается, только если в ней есть параметр.
+    """
+    mode = request.META.get(PROFILE_HEADER)
+    if mode is None and PROFILE_PARAM in request.META.get('QUERY_STRING', ''):
+        mode = request.GET.get(PROFILE_PARAM)
+    return mode if mode in PROFILERS else None
+
+
+def capture(mode, request, get_response):
+    """
+    Выполнение запроса под профилировщиком mode и сохранение профиля.
+    Если в процессе уже снимается профиль, запрос не выполняется.
+    """
+    if not _active.acquire(blocking=False):
+        return JsonResponse(
+            {'detail': 'В этом процессе уже снимается профиль, '
+                       'повторите запрос позже.'},
+            status=409,
+        )
+    factory, write, extension = PROFILERS[mode]
+    try:
+        profiler = factory()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    finally:
+        _active.release()
+    duration = time.perf_counter() - started
+    profile_id = f'{time.time_ns():020d}-{secrets.token_hex(4)}'
+    meta = {
+        'id': profile_id,
+        'profiler': mode,
+        'file': profile_id + extension,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+    save(meta, lambda path: write(
+        profiler, path, f'{request.method} {meta["path"]}'
+    ))
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def save(meta, write):
+    """
+    Атомарная запись профиля и его описания, затем удаление старых.
+    """
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, meta['file'])
+    write(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    meta_path = os.path.join(directory, meta['id'] + META_SUFFIX)
+    with open(meta_path + '.tmp', 'w') as file:
+        json.dump(meta, file)
+    os.replace(meta_path + '.tmp', meta_path)
+    prune(directory, settings.PROFILING_KEEP)
+
+
+def stored_ids(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        name[:-len(META_SUFFIX)] for name in names
+        if name.endswith(META_SUFFIX)
+    )
+
+
+def prune(directory, keep):
+    ids = stored_ids(directory)
+    for profile_id in ids[:max(len(ids) - keep, 0)]:
+        for name in os.listdir(directory):
+            if name.startswith(profile_id):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    # Удалён другим воркером.
+                    pass
+
+
+def load_meta(profile_id):
+    """
+    Описание профиля или None, если его уже нет.
+    """
+    if not re.fullmatch(PROFILE_ID_RE, profile_id):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, profile_id + META_SUFFIX)
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def profile_path(meta):
+    return os.path.join(settings.PROFILING_DIR, meta['file'])
+
+
+def profiles():
+    """
+    Описания сохранённых профилей, новые первыми.
+    """
+    ids = reversed(stored_ids(settings.PROFILING_DIR))
+    return [meta for meta in map(load_meta, ids) if meta is not None]
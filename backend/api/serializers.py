@@ -7,19 +7,37 @@ from rest_framework.fields import SerializerMethodField
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from django.contrib.auth import get_user_model
 
+from foodgram.metrics import IMAGE_SECONDS
+from recipes.catalogue import get_catalogue
+from recipes import planning
+from recipes.tasks import delete_file
+from tasks.registry import enqueue_on_commit
 from users.models import Subscriptions
 
+from .mixins import (
+    SparseFieldsMixin,
+    TimedListSerializer,
+    compact_pk,
+    followed_authors,
+)
+
 from recipes.models import (
     Tag,
     Ingredient,
     Recipe,
     AmountIngredient,
+    MealPlan,
+    RECIPE_CARD_FIELDS,
 )
 
 User = get_user_model()
 
+# Поля пользователя, которые отдаёт API: остальные (хеш пароля, даты,
+# флаги) из базы не читаются.
+USER_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
 
-class CustomUserSerializer(UserSerializer):
+
+class CustomUserSerializer(SparseFieldsMixin, UserSerializer):
     """
     Получение информации о пользователе.
     """
@@ -27,6 +45,7 @@ class CustomUserSerializer(UserSerializer):
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = (
             'email',
             'id',
@@ -40,10 +59,7 @@ class CustomUserSerializer(UserSerializer):
         """
         Информация о подписке на данного автора.
         """
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscriptions.objects.filter(user=user, author=obj).exists()
+        return obj.pk in followed_authors(self.context.get('request'))
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -77,6 +93,7 @@ class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'name',
@@ -92,6 +109,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'name',
@@ -109,11 +127,14 @@ class Base64ImageField(serializers.ImageField):
         Переопределение метода: если полученный объект строка, и эта строка
         начинается с 'data:image'...
         """
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        with IMAGE_SECONDS.time(operation='decode'):
+            if isinstance(data, str) and data.startswith('data:image'):
+                format, imgstr = data.split(';base64,')
+                ext = format.split('/')[-1]
+                data = ContentFile(
+                    base64.b64decode(imgstr), name='temp.' + ext
+                )
+            return super().to_internal_value(data)
 
 
 class AmountIngredientSerializer(serializers.ModelSerializer):
@@ -122,11 +143,8 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
     """
 
     id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
-    name = serializers.CharField(source='ingredient.name', read_only=True)
-    measurement_unit = serializers.CharField(
-        source='ingredient.measurement_unit',
-        read_only=True
-    )
+    name = serializers.SerializerMethodField()
+    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
         model = AmountIngredient
@@ -137,6 +155,21 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
             'measurement_unit',
         )
 
+    def get_ingredient(self, obj):
+        """
+        Ингредиент из справочника в памяти процесса: связанная строка
+        не загружается.
+        """
+        return get_catalogue(self.context.get('request')).ingredient(
+            obj.ingredient_id
+        )
+
+    def get_name(self, obj):
+        return self.get_ingredient(obj).name
+
+    def get_measurement_unit(self, obj):
+        return self.get_ingredient(obj).measurement_unit
+
 
 class AmountIngredientRecipeSerializer(serializers.ModelSerializer):
     """
@@ -150,10 +183,14 @@ class AmountIngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Получение информации о рецепте.
     """
+    compact_fields = {
+        'author': compact_pk(),
+        'tags': compact_pk(many=True),
+    }
 
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
@@ -168,6 +205,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'tags',
@@ -185,6 +223,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Получение информации: добавлен ли рецепт в избранное.
         """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return (user.is_authenticated
                 and Recipe.objects.filter(
@@ -197,6 +237,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Получение информации: добавлен ли рецепт в список покупок.
         """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return (user.is_authenticated
                 and Recipe.objects.filter(
@@ -206,13 +248,31 @@ class RecipeSerializer(serializers.ModelSerializer):
                 )
 
 
+class CatalogueTagField(serializers.PrimaryKeyRelatedField):
+    """
+    Тег по id из справочника в памяти процесса, без запроса на каждый
+    тег.
+    """
+
+    def to_internal_value(self, data):
+        tags = get_catalogue(self.context.get('request')).tags
+        try:
+            tag = tags.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            # Тег, созданный в обход сигналов, ищется в базе.
+            return super().to_internal_value(data)
+        return tag
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """
     Создание рецепта.
     """
 
     image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = CatalogueTagField(
         queryset=Tag.objects.all(),
         many=True
     )
@@ -240,7 +300,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         """
         ingredients_list = [
             AmountIngredient(
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount'],
             ) for ingredient in ingredients
@@ -255,12 +315,13 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if not ingredients:
             raise serializers.ValidationError('Необходимо добавить '
                                               'ингридиет(ы)!')
-        validated_ingredients = []
+        unknown = get_catalogue(
+            self.context.get('request')
+        ).unknown_ingredients(ingredient['id'] for ingredient in ingredients)
+        validated_ingredients = set()
         for ingredient in ingredients:
             amount = ingredient['amount']
-            id_to_check = ingredient['id']
-            ingredient_to_check = Ingredient.objects.filter(id=id_to_check)
-            if not ingredient_to_check.exists():
+            if ingredient['id'] in unknown:
                 raise serializers.ValidationError(
                     'Ингридиента нет в базе!')
             if not isinstance(amount, (float, int)):
@@ -269,14 +330,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             if amount <= 0:
                 raise serializers.ValidationError('Количество ингредиента'
                                                   ' должно быть больше 0')
-            ingredient_to_check = get_object_or_404(
-                Ingredient,
-                id=ingredient['id']
-            )
-            if ingredient_to_check in validated_ingredients:
+            if ingredient['id'] in validated_ingredients:
                 raise serializers.ValidationError('Ингредиенты не должны'
                                                   ' повторяться!')
-            validated_ingredients.append(ingredient_to_check)
+            validated_ingredients.add(ingredient['id'])
         return value
 
     def validate_tags(self, value):
@@ -314,12 +371,20 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         """
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        old_image = instance.image.name
         instance = super().update(instance, validated_data)
         instance.tags.clear()
         instance.tags.set(tags)
         instance.ingredients.clear()
         self.ingredients_create(recipe=instance, ingredients=ingredients)
+        # bulk_create не отправляет сигналов: недели плана питания с этим
+        # рецептом сбрасываются явно (после фиксации транзакции).
+        planning.invalidate_recipes([instance.pk])
         instance.save()
+        # Новая картинка увеличила счётчик ссылок хранилища, даже если
+        # совпала со старой, поэтому ссылка на старую освобождается всегда.
+        if old_image and 'image' in validated_data:
+            enqueue_on_commit(delete_file, old_image)
         return instance
 
     def to_representation(self, instance):
@@ -330,27 +395,15 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
     """
-    Получение информации об избранных рецептов.
+    Карточка рецепта, добавленного в избранное или список покупок.
     """
 
-    name = serializers.ReadOnlyField(source='recipe.name')
-    image = Base64ImageField(source='recipe.image')
-    cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
+    image = Base64ImageField()
 
     class Meta:
         model = Recipe
-        fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time',
-        )
-        read_only_fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time',
-        )
+        fields = RECIPE_CARD_FIELDS
+        read_only_fields = RECIPE_CARD_FIELDS
 
 
 class RecipeSubscribeSerializer(serializers.ModelSerializer):
@@ -363,17 +416,26 @@ class RecipeSubscribeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time',
-        )
-        read_only_fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time',
+        list_serializer_class = TimedListSerializer
+        fields = RECIPE_CARD_FIELDS
+        read_only_fields = RECIPE_CARD_FIELDS
+
+
+class TrendingRecipeSerializer(RecipeSubscribeSerializer):
+    """
+    Рецепт в списке популярных с количеством добавлений за окно.
+    """
+    favorites = serializers.IntegerField(
+        source='favorites_count', read_only=True
+    )
+    shopping_carts = serializers.IntegerField(
+        source='shopping_carts_count', read_only=True
+    )
+
+    class Meta(RecipeSubscribeSerializer.Meta):
+        fields = RecipeSubscribeSerializer.Meta.fields + (
+            'favorites',
+            'shopping_carts',
         )
 
 
@@ -392,6 +454,7 @@ class SubscribeSerializer(CustomUserSerializer):
 
     class Meta:
         model = Subscriptions
+        list_serializer_class = TimedListSerializer
         fields = (
             'email',
             'id',
@@ -407,15 +470,55 @@ class SubscribeSerializer(CustomUserSerializer):
         """
         Информация о подписке на данного пользователя.
         """
-        return Subscriptions.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        return obj.author_id in followed_authors(self.context.get('request'))
 
     def get_recipes(self, obj):
         """Получение рецептов автора."""
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
+        queryset = Recipe.objects.filter(
+            author_id=obj.author_id
+        ).only(*RECIPE_CARD_FIELDS)
         if limit:
             queryset = queryset[:int(limit)]
         return RecipeSubscribeSerializer(queryset, many=True).data
+
+
+class MealPlanSerializer(serializers.ModelSerializer):
+    """
+    Запись плана питания: рецепт на дату с количеством порций.
+    """
+
+    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
+
+    class Meta:
+        model = MealPlan
+        list_serializer_class = TimedListSerializer
+        fields = (
+            'id',
+            'date',
+            'recipe',
+            'servings',
+        )
+
+    def validate(self, data):
+        user = self.context['request'].user
+        date = data.get('date', getattr(self.instance, 'date', None))
+        recipe = data.get('recipe', getattr(self.instance, 'recipe', None))
+        duplicates = MealPlan.objects.filter(
+            user=user, date=date, recipe=recipe
+        )
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError(
+                'Рецепт уже есть в плане на эту дату!'
+            )
+        return data
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['recipe'] = RecipeSubscribeSerializer(
+            instance.recipe, context=self.context
+        ).data
+        return data
@@ -0,0 +1,266 @@
+"""
+Живые обновления по Server-Sent Events: GET /api/events/.
+
+Поток обслуживается отдельным ASGI-приложением (foodgram/asgi.py):
+Django 3.2 отдаёт потоковые ответы синхронно и занял бы цикл событий.
+Соединение почти ничего не стоит — очередь и две задачи asyncio, —
+поэтому воркер uvicorn держит тысячи простаивающих клиентов
+(см. manage.py bench_events).
+
+События:
+    recipe — новый рецепт автора, на которого подписан пользователь;
+    counts — количество добавлений в избранное и список покупок для
+             рецептов из ?recipes=1,2,3;
+    subscription — подписка или отписка пользователя (обновляет и
+             набор авторов соединения);
+    reset  — клиент не успевал читать, очередь сброшена: нужно
+             досинхронизироваться через /api/changes/ и переподключиться.
+
+Токен передаётся заголовком Authorization: Token <ключ> или параметром
+?token= (EventSource в браузере не умеет заголовки). Без токена
+доступны только события counts.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.authtoken.models import Token
+
+from foodgram.pubsub import hub
+from users.models import Subscriptions
+
+EVENTS_PATH = '/api/events/'
+
+RESET = b'event: reset\ndata: {}\n\n'
+PING = b': ping\n\n'
+
+
+def encode(event):
+    """
+    Сообщение SSE; кодируется один раз для всех получателей.
+    """
+    data = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+    return f'event: {event["type"]}\ndata: {data}\n\n'.encode()
+
+
+class Connection:
+    """
+    Клиент потока событий. Очередь ограничена EVENTS_QUEUE_SIZE: если
+    клиент не успевает читать, его сообщения не копятся в памяти
+    воркера — очередь сбрасывается и клиент получает reset. Клиент,
+    который не принимает данные дольше EVENTS_HEARTBEAT_SECONDS,
+    отключается.
+    """
+
+    def __init__(self, user_id, following, recipes):
+        self.user_id = user_id
+        self.following = following
+        self.recipes = recipes
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class Registry:
+    """
+    Соединения процесса с индексами по пользователю, автору и рецепту:
+    событие разбирается один раз и доходит только до своих получателей.
+    """
+
+    def __init__(self):
+        self.connections = set()
+        self.by_user = defaultdict(set)
+        self.by_author = defaultdict(set)
+        self.by_recipe = defaultdict(set)
+
+    def __len__(self):
+        return len(self.connections)
+
+    @staticmethod
+    def _discard(index, key, connection):
+        connections = index.get(key)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del index[key]
+
+    def add(self, connection):
+        if not self.connections:
+            hub.subscribe(self.route)
+        self.connections.add(connection)
+        if connection.user_id is not None:
+            self.by_user[connection.user_id].add(connection)
+        for author_id in connection.following:
+            self.by_author[author_id].add(connection)
+        for recipe_id in connection.recipes:
+            self.by_recipe[recipe_id].add(connection)
+
+    def remove(self, connection):
+        self.connections.discard(connection)
+        self._discard(self.by_user, connection.user_id, connection)
+        for author_id in connection.following:
+            self._discard(self.by_author, author_id, connection)
+        for recipe_id in connection.recipes:
+            self._discard(self.by_recipe, recipe_id, connection)
+        if not self.connections:
+            hub.unsubscribe(self.route)
+
+    def follow(self, user_id, author_id, active):
+        for connection in self.by_user.get(user_id, ()):
+            if active:
+                connection.following.add(author_id)
+                self.by_author[author_id].add(connection)
+            else:
+                connection.following.discard(author_id)
+                self._discard(self.by_author, author_id, connection)
+
+    def route(self, event):
+        kind = event.get('type')
+        if kind == 'recipe':
+            targets = self.by_author.get(event['author'], ())
+        elif kind == 'counts':
+            targets = self.by_recipe.get(event['recipe'], ())
+        elif kind == 'subscription':
+            self.follow(event['user'], event['author'], event['active'])
+            targets = self.by_user.get(event['user'], ())
+        else:
+            return
+        if not targets:
+            return
+        message = encode(event)
+        for connection in tuple(targets):
+            connection.push(message)
+
+
+registry = Registry()
+
+
+def authenticate(key):
+    """
+    id активного пользователя по токену и id авторов, на которых он
+    подписан. Выполняется в потоке для синхронного кода.
+    """
+    close_old_connections()
+    user_id = Token.objects.filter(
+        key=key, user__is_active=True
+    ).values_list('user_id', flat=True).first()
+    if user_id is None:
+        return None, set()
+    return user_id, set(Subscriptions.objects.filter(
+        user_id=user_id
+    ).values_list('author_id', flat=True))
+
+
+def parse_recipes(value):
+    recipes = set()
+    for item in value.split(','):
+        item = item.strip()
+        if item.isdigit():
+            recipes.add(int(item))
+    return set(sorted(recipes)[:settings.EVENTS_MAX_RECIPES])
+
+
+def get_token(scope, params):
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token' and key:
+                return key.strip()
+    return params.get('token', [None])[0]
+
+
+async def respond(send, status, message, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'), *headers,
+        ],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'errors': message}, ensure_ascii=False).encode(),
+    })
+
+
+async def stream(connection, send):
+    heartbeat = settings.EVENTS_HEARTBEAT_SECONDS
+
+    async def write(body, more_body=True):
+        # send() ждёт, пока клиент примет данные: медленный клиент
+        # задерживает только свою очередь, а зависший отключается.
+        await asyncio.wait_for(send({
+            'type': 'http.response.body',
+            'body': body,
+            'more_body': more_body,
+        }), heartbeat)
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            # nginx не должен буферизовать поток.
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await write(b'retry: 5000\n\n')
+    while True:
+        try:
+            message = await asyncio.wait_for(
+                connection.queue.get(), heartbeat
+            )
+        except asyncio.TimeoutError:
+            message = PING
+        await write(message, more_body=message is not RESET)
+        if message is RESET:
+            return
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def events_application(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await respond(send, 405, 'Метод не поддерживается')
+    if len(registry) >= settings.EVENTS_MAX_CONNECTIONS:
+        return await respond(
+            send, 503, 'Слишком много соединений', [(b'retry-after', b'5')]
+        )
+    params = parse_qs(scope['query_string'].decode('latin-1'))
+    user_id, following = None, set()
+    key = get_token(scope, params)
+    if key:
+        user_id, following = await sync_to_async(authenticate)(key)
+        if user_id is None:
+            return await respond(send, 401, 'Недопустимый токен')
+    connection = Connection(
+        user_id, following, parse_recipes(params.get('recipes', [''])[0])
+    )
+    registry.add(connection)
+    tasks = (
+        asyncio.ensure_future(stream(connection, send)),
+        asyncio.ensure_future(wait_disconnect(receive)),
+    )
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        registry.remove(connection)
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                # Разрыв соединения во время send() — обычное завершение.
+                task.exception()
+            task.cancel()
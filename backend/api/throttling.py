@@ -0,0 +1,184 @@
+"""
+Ограничение частоты запросов алгоритмом token bucket.
+
+Настройки областей (scope) берутся из THROTTLE_BUCKETS:
+
+    'recipes': {'capacity': 60, 'refill_rate': 1, 'backend': 'file'}
+
+capacity — ёмкость корзины, refill_rate — пополнение токенов в секунду,
+backend — хранилище состояния:
+    local — словарь в памяти процесса без блокировок, лимит действует
+            в каждом воркере отдельно; для самых дешёвых запросов;
+    file  — общий для всех воркеров файл с блокировкой записи по слоту.
+
+Область задаётся атрибутом throttle_scope представления, стоимость
+действия — словарём throttle_costs (по умолчанию 1 токен).
+"""
+import logging
+import os
+import struct
+import threading
+import time
+from hashlib import blake2b
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from foodgram.metrics import THROTTLE_REQUESTS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCOPE = 'default'
+# Как часто LocalBuckets удаляет наполнившиеся корзины, секунд.
+SWEEP_INTERVAL = 60
+
+
+def refill(tokens, updated, now, capacity, refill_rate, cost):
+    """
+    Пополнение корзины и списание cost токенов.
+    Возвращает новый остаток и время ожидания (0 — запрос разрешён).
+    """
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    cost = min(cost, capacity)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / refill_rate
+
+
+class LocalBuckets:
+    """
+    Корзины в памяти процесса. Состояние ключа заменяется целиком одной
+    операцией со словарём, поэтому блокировки не нужны; при гонке
+    потоков лимит может быть превышен на единицы токенов.
+    """
+
+    def __init__(self, scope):
+        self.buckets = {}
+        self.swept = time.monotonic()
+
+    def sweep(self, now, capacity, refill_rate):
+        """
+        Удаление корзин, которые за время простоя наполнились: ключ без
+        корзины и так получает полную.
+        """
+        self.swept = now
+        idle_since = now - capacity / refill_rate
+        for key, (_, updated) in list(self.buckets.items()):
+            if updated < idle_since:
+                self.buckets.pop(key, None)
+
+    def consume(self, key, capacity, refill_rate, cost):
+        now = time.monotonic()
+        if now - self.swept > SWEEP_INTERVAL:
+            self.sweep(now, capacity, refill_rate)
+        tokens, updated = self.buckets.get(key, (capacity, now))
+        tokens, wait = refill(tokens, updated, now, capacity, refill_rate,
+                              cost)
+        self.buckets[key] = (tokens, now)
+        return wait
+
+
+class FileBuckets:
+    """
+    Корзины в файле фиксированного размера, общем для воркеров.
+    Ключ хешируется в один из slots слотов (хеш ключа, токены, время);
+    слот блокируется fcntl.lockf только на время чтения и записи.
+    Ключи с общим слотом делят одну корзину: коллизия делает лимит
+    строже, но не сбрасывает его.
+    """
+    slot = struct.Struct('<Qdd')
+
+    def __init__(self, scope, slots=4096):
+        self.slots = slots
+        self.path = os.path.join(
+            getattr(settings, 'THROTTLE_FILE_DIR', '/tmp/foodgram-throttle'),
+            f'{scope}.buckets',
+        )
+        self.fd = None
+        # Блокировки fcntl действуют между процессами, но не между
+        # потоками одного процесса.
+        self.lock = threading.Lock()
+
+    def get_fd(self):
+        if self.fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        return self.fd
+
+    def consume(self, key, capacity, refill_rate, cost):
+        key_hash = int.from_bytes(
+            blake2b(key.encode(), digest_size=8).digest(), 'little'
+        )
+        offset = key_hash % self.slots * self.slot.size
+        with self.lock:
+            fd = self.get_fd()
+            fcntl.lockf(fd, fcntl.LOCK_EX, self.slot.size, offset)
+            try:
+                now = time.time()
+                data = os.pread(fd, self.slot.size, offset)
+                tokens, updated = capacity, now
+                if len(data) == self.slot.size:
+                    _, tokens, updated = self.slot.unpack(data)
+                tokens, wait = refill(tokens, updated, now, capacity,
+                                      refill_rate, cost)
+                os.pwrite(fd, self.slot.pack(key_hash, tokens, now), offset)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, self.slot.size, offset)
+        return wait
+
+
+BACKENDS = {
+    'local': LocalBuckets,
+    'file': FileBuckets if fcntl is not None else LocalBuckets,
+}
+
+_buckets = {}
+
+
+def get_buckets(scope, backend):
+    if scope not in _buckets:
+        _buckets[scope] = BACKENDS[backend](scope)
+    return _buckets[scope]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Ограничение запросов пользователя (или IP для анонимов) в области
+    представления. Стоимость запроса зависит от действия.
+    """
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        scope = getattr(view, 'throttle_scope', DEFAULT_SCOPE)
+        config = getattr(settings, 'THROTTLE_BUCKETS', {}).get(scope)
+        if config is None:
+            return True
+        cost = getattr(view, 'throttle_costs', {}).get(
+            getattr(view, 'action', None), 1
+        )
+        if request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        wait = get_buckets(scope, config.get('backend', 'local')).consume(
+            f'{scope}:{ident}',
+            config['capacity'],
+            config['refill_rate'],
+            cost,
+        )
+        if wait:
+            THROTTLE_REQUESTS.inc(scope=scope, result='throttled')
+            logger.info('Запрос %s в области %s ограничен на %.1f с',
+                        ident, scope, wait)
+            self.retry_after = wait
+            return False
+        THROTTLE_REQUESTS.inc(scope=scope, result='allowed')
+        return True
+
+    def wait(self):
+        return self.retry_after
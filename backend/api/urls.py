@@ -6,6 +6,9 @@ from .views import (
     IngredientViewSet,
     RecipeViewSet,
     SubscriptionsViewSet,
+    MealPlanViewSet,
+    ChangesViewSet,
+    ProfilesViewSet,
 )
 
 app_name = 'api'
@@ -16,6 +19,9 @@ router.register('users', SubscriptionsViewSet)
 router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
+router.register('meal-plan', MealPlanViewSet, basename='meal-plan')
+router.register('changes', ChangesViewSet, basename='changes')
+router.register('profiles', ProfilesViewSet, basename='profiles')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,18 +1,32 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     AllowAny, SAFE_METHODS,
 )
 from rest_framework.response import Response
+from djoser import utils
 from djoser.views import UserViewSet
 
-from .filters import IngredientFilter, RecipeFilter
+from . import profiling
+from .filters import IngredientFilter, MealPlanFilter, RecipeFilter
+from .mixins import (
+    ConditionalRetrieveMixin,
+    ReplicaReadMixin,
+    is_requested,
+)
+from .pagination import FeedPagination
 from .permissions import IsOwnerOrReadOnly, IsAdminOrReadOnly
 from users.models import Subscriptions
 from recipes.models import (
@@ -22,7 +36,15 @@ from recipes.models import (
     Favorite,
     ShoppingCart,
     AmountIngredient,
+    MealPlan,
+    Change,
+    RECIPE_CARD_FIELDS,
 )
+from recipes import changes, planning
+from recipes.deletion import delete_recipes, delete_user
+from recipes.transfer import Importer, export_lines
+from recipes.units import amount_in_base_units, format_amount
+from stats.reports import author_stats, parse_window, trending
 from .serializers import (
     CustomUserSerializer,
     TagSerializer,
@@ -31,18 +53,99 @@ from .serializers import (
     RecipeCreateSerializer,
     FavoriteRecipeSerializer,
     SubscribeSerializer,
+    MealPlanSerializer,
+    TrendingRecipeSerializer,
+    USER_FIELDS,
 )
 
 User = get_user_model()
 
+# Поля автора рецепта, которые не нужны CustomUserSerializer.
+AUTHOR_DEFERRED = tuple(
+    f'author__{field.name}' for field in User._meta.concrete_fields
+    if field.name not in USER_FIELDS
+)
+
+
+def recipes_for_reading(queryset, request):
+    """
+    Подгрузка связанных объектов только для запрошенных полей
+    RecipeSerializer (см. параметры ?fields= и ?expand=).
+    """
+    if is_requested(request, 'author', expanded=True):
+        queryset = queryset.select_related('author').defer(
+            *AUTHOR_DEFERRED
+        )
+    if is_requested(request, 'tags'):
+        queryset = queryset.prefetch_related('tags')
+    if not is_requested(request, 'text'):
+        # Сетка карточек (?fields=id,name,image,cooking_time) не читает
+        # длинное описание.
+        queryset = queryset.defer('text')
+    if is_requested(request, 'ingredients'):
+        queryset = queryset.prefetch_related('amountingredient_set')
+    user = request.user
+    if user.is_authenticated:
+        for name, model in (
+            ('is_favorited', Favorite),
+            ('is_in_shopping_cart', ShoppingCart),
+        ):
+            if is_requested(request, name):
+                queryset = queryset.annotate(**{name: Exists(
+                    model.objects.filter(user=user, recipe=OuterRef('pk'))
+                )})
+    return queryset
+
 
-class SubscriptionsViewSet(UserViewSet):
+class SubscriptionsViewSet(ConditionalRetrieveMixin, ReplicaReadMixin,
+                           UserViewSet):
     """
     Подписка на автора.
     """
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     additional_serializer = SubscribeSerializer
+    replica_actions = ()
+    throttle_scope = 'users'
+
+    def get_queryset(self):
+        """
+        Для чтения загружаются только поля, которые отдаёт API; список
+        упорядочен, чтобы страницы пагинации не пересекались.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(*USER_FIELDS)
+        if self.action == 'list':
+            queryset = queryset.order_by('id')
+        return queryset
+
+    def get_validators(self):
+        """
+        Состояние профиля пользователя для ETag одним запросом
+        (для /users/me/ — текущего пользователя).
+        """
+        user = self.request.user
+        queryset = User.objects.filter(id=self.kwargs.get('id', user.pk))
+        fields = ['email', 'username', 'first_name', 'last_name']
+        if user.is_authenticated:
+            queryset = queryset.annotate(subscribed=Exists(
+                Subscriptions.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+            fields.append('subscribed')
+        state = queryset.values_list(*fields).first()
+        if state is None:
+            return None
+        return state, None
+
+    def perform_destroy(self, instance):
+        """
+        Удаление пользователя вместе с рецептами без загрузки связанных
+        объектов в память.
+        """
+        if instance == self.request.user:
+            utils.logout_user(self.request)
+        delete_user(instance)
 
     @action(
         detail=False,
@@ -53,7 +156,11 @@ class SubscriptionsViewSet(UserViewSet):
         Получение информации об авторе.
         """
         user = request.user
-        authors = Subscriptions.objects.filter(user=user)
+        authors = Subscriptions.objects.filter(
+            user=user
+        ).select_related('author').only(
+            'author', *(f'author__{name}' for name in USER_FIELDS)
+        )
         pages = self.paginate_queryset(authors)
         serializer = self.additional_serializer(
             pages,
@@ -82,7 +189,10 @@ class SubscriptionsViewSet(UserViewSet):
                     {'errors': 'Вы уже подписаны на данного пользователя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            subscribe = Subscriptions.objects.create(user=user, author=author)
+            with changes.atomic():
+                subscribe = Subscriptions.objects.create(
+                    user=user, author=author
+                )
             serializer = self.additional_serializer(
                 subscribe, context={'request': request}
             )
@@ -95,15 +205,37 @@ class SubscriptionsViewSet(UserViewSet):
                 )
             follow = Subscriptions.objects.filter(user=user, author=author)
             if follow.exists():
-                follow.delete()
+                with changes.atomic():
+                    follow.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': 'У вас нет подписки на такого автора'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(
+        detail=True,
+        permission_classes=(AllowAny,)
+    )
+    def stats(self, request, **kwargs):
+        """
+        Статистика автора за ?days= дней (по умолчанию 30): добавления
+        его рецептов в избранное и список покупок и новые подписчики.
+        """
+        author = get_object_or_404(User, id=kwargs.get('id'))
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= 365:
+            return Response(
+                {'errors': 'days должен быть целым числом от 1 до 365'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(author_stats(author.id, days))
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     Получение тэгов.
     """
@@ -111,9 +243,10 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
+    throttle_scope = 'catalog'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     Получение ингредиентов.
     """
@@ -123,9 +256,12 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    throttle_scope = 'catalog'
+    throttle_costs = {'list': 5}
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalRetrieveMixin, ReplicaReadMixin,
+                    viewsets.ModelViewSet):
     """
     Работа с рецептами: просмотр, добавление, редактирование и удаление.
     Добавление рецептов в избранное и в список покупок.
@@ -136,6 +272,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
     additional_serializer = FavoriteRecipeSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    throttle_scope = 'recipes'
+    throttle_costs = {
+        'create': 5,
+        'update': 5,
+        'partial_update': 5,
+        'download_shopping_cart': 20,
+        'export_recipes': 50,
+        'import_recipes': 50,
+        'trending': 5,
+    }
 
     def get_serializer_class(self):
         """
@@ -145,21 +291,77 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    def get_queryset(self):
+        """
+        Подгрузка связанных объектов только для запрошенных полей.
+        """
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return recipes_for_reading(queryset, self.request)
+
+    def get_validators(self):
+        """
+        Состояние рецепта для ETag и Last-Modified одним запросом.
+        """
+        user = self.request.user
+        queryset = Recipe.objects.filter(pk=self.kwargs['pk'])
+        fields = [
+            'updated_at',
+            'author__email',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+        ]
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                subscribed=Exists(Subscriptions.objects.filter(
+                    user=user, author=OuterRef('author')
+                )),
+            )
+            fields += ['favorited', 'in_shopping_cart', 'subscribed']
+        state = queryset.values_list(*fields).first()
+        if state is None:
+            return None
+        return state, state[0]
+
+    @changes.atomic()
     def perform_create(self, serializer):
         """
         Назначение пользователя, который делает запрос, автором рецепта.
+        Рецепт, его теги и ингредиенты сохраняются вместе с записями
+        журнала изменений в одной транзакции.
         """
         serializer.save(author=self.request.user)
 
+    @changes.atomic()
+    def perform_update(self, serializer):
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        """
+        Удаление рецепта без загрузки связанных объектов в память.
+        """
+        delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
     def add_recipe(self, model, request, pk):
         """
         Добавление рецепта к списку избранных рецептов или списку покупок.
         """
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RECIPE_CARD_FIELDS), id=pk
+        )
         if model.objects.filter(recipe=recipe, user=request.user).exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        instance = model.objects.create(user=request.user, recipe=recipe)
-        serializer = FavoriteRecipeSerializer(instance,
+        with changes.atomic():
+            model.objects.create(user=request.user, recipe=recipe)
+        serializer = FavoriteRecipeSerializer(recipe,
                                               context={'request': request})
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
@@ -167,13 +369,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Удаление рецепта из списка избранных рецептов или списка покупок.
         """
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(Recipe.objects.only('id'), id=pk)
         if model.objects.filter(
             user=request.user, recipe=recipe
         ).exists():
-            model.objects.filter(
-                user=request.user, recipe=recipe
-            ).delete()
+            with changes.atomic():
+                model.objects.filter(
+                    user=request.user, recipe=recipe
+                ).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -201,6 +404,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'DELETE':
             return self.delete_recipe(ShoppingCart, request, kwargs.get('pk'))
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь,
+        с keyset-пагинацией по дате публикации. Рецепты страницы
+        читаются так же, как в списке (?fields=, ?expand=, аннотации
+        избранного и списка покупок).
+        """
+        paginator = FeedPagination()
+        recipes = paginator.paginate_feed(
+            request, request.user, queryset=self.get_queryset()
+        )
+        serializer = RecipeSerializer(
+            recipes,
+            many=True,
+            context={'request': request}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         methods=['GET'],
         detail=False,
@@ -213,27 +439,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         ingredients = AmountIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
+            recipe__shopping_cart__user=user
         ).values_list(
             'ingredient__name',
-            'ingredient__measurement_unit'
+            'ingredient__base_unit',
         ).order_by(
             'ingredient__name'
         ).annotate(
-            ingredient_sum=Sum('amount')
+            total=Sum(amount_in_base_units)
         )
         filename = f'{user.username}_shopping_list'
-        temp_shopping_cart = {}
-        for ingredient in ingredients:
-            name = ingredient[0]
-            temp_shopping_cart[name] = {
-                'amount': ingredient[2],
-                'measurement_unit': ingredient[1]
-            }
-            shopping_cart = ["Список покупок\n\n"]
-            for key, value in temp_shopping_cart.items():
-                shopping_cart.append(f'{key} - {value["amount"]} '
-                                     f'{value["measurement_unit"]}\n')
+        shopping_cart = ['Список покупок\n\n']
+        for name, unit, total in ingredients:
+            shopping_cart.append(f'{name} - {format_amount(total, unit)}\n')
         response = HttpResponse(
             shopping_cart, content_type='text.txt; charset=utf-8'
         )
@@ -241,3 +459,256 @@ class RecipeViewSet(viewsets.ModelViewSet):
             f'attachment; filename={filename}.txt'
         )
         return response
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='export',
+        permission_classes=(IsAdminUser,)
+    )
+    def export_recipes(self, request):
+        """
+        Выгрузка рецептов в NDJSON потоком (см. recipes/transfer.py).
+        Параметр ?author= ограничивает выгрузку рецептами авторов.
+        """
+        recipes = Recipe.objects.all()
+        authors = request.query_params.getlist('author')
+        if authors:
+            recipes = recipes.filter(author__username__in=authors)
+        response = StreamingHttpResponse(
+            export_lines(recipes), content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename=recipes.ndjson'
+        )
+        return response
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='import',
+        permission_classes=(IsAdminUser,)
+    )
+    def import_recipes(self, request):
+        """
+        Загрузка рецептов из тела запроса в NDJSON. Тело читается
+        построчно, без разбора парсерами DRF.
+        """
+        importer = Importer().run(request.stream or ())
+        if importer.created:
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': importer.created,
+            'error_count': importer.error_count,
+            'errors': importer.errors,
+        }, status=response_status)
+
+    @action(methods=['GET'], detail=False)
+    def trending(self, request):
+        """
+        Популярные рецепты: больше всего добавлений в избранное и
+        список покупок за окно ?window= (24h, 7d, ...). Читаются только
+        агрегаты статистики, обновляемые командой rollup_stats.
+        """
+        window = parse_window(request.query_params.get('window', '24h'))
+        if window is None:
+            return Response(
+                {'errors': 'Окно задаётся как 24h или 7d, не больше 365d'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 100)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(
+                {'errors': 'limit должен быть целым числом от 1 до 100'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        rows = trending(window, limit)
+        recipes = Recipe.objects.only(*RECIPE_CARD_FIELDS).in_bulk(
+            [row[0] for row in rows]
+        )
+        result = []
+        for recipe_id, favorites, shopping_carts in rows:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.favorites_count = favorites
+            recipe.shopping_carts_count = shopping_carts
+            result.append(recipe)
+        serializer = TrendingRecipeSerializer(
+            result, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+
+class MealPlanViewSet(viewsets.ModelViewSet):
+    """
+    План питания пользователя: рецепты по датам с количеством порций
+    и список покупок на неделю.
+    """
+    serializer_class = MealPlanSerializer
+    permission_classes = (IsAuthenticated,)
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = MealPlanFilter
+    pagination_class = None
+    throttle_scope = 'recipes'
+
+    def get_queryset(self):
+        return MealPlan.objects.filter(
+            user=self.request.user
+        ).select_related('recipe').defer('recipe__text')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(methods=['GET'], detail=False)
+    def shopping_list(self, request):
+        """
+        Список покупок на неделю, в которую входит ?date=
+        (по умолчанию текущая).
+        """
+        day = timezone.now().date()
+        if 'date' in request.query_params:
+            try:
+                day = parse_date(request.query_params['date'])
+            except ValueError:
+                day = None
+            if day is None:
+                return Response(
+                    {'errors': 'Дата должна быть в формате ГГГГ-ММ-ДД'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        start = planning.week_start(day)
+        return Response({
+            'start': start,
+            'end': start + timedelta(days=6),
+            'ingredients': planning.week_shopping_list(request.user.id, day),
+        })
+
+
+class ChangesViewSet(viewsets.ViewSet):
+    """
+    Журнал изменений для синхронизации клиентов (см. recipes/changes.py).
+
+    Без ?since= возвращается текущий курсор: клиент загружает данные
+    целиком и запоминает его. С ?since=<курсор> — изменения после
+    курсора: upsert с актуальным объектом (для рецептов, тегов и
+    ингредиентов) или delete. Для избранного, списка покупок и подписок
+    id — это id рецепта или автора. Пока has_more, запрос повторяется
+    с новым курсором. 410 — курсор устарел, нужна полная загрузка.
+    """
+    permission_classes = (AllowAny,)
+    throttle_scope = 'recipes'
+    max_limit = 1000
+    object_serializers = {
+        Change.TAG: (Tag, TagSerializer),
+        Change.INGREDIENT: (Ingredient, IngredientSerializer),
+    }
+
+    def list(self, request):
+        params = request.query_params
+        if 'since' not in params:
+            return Response({
+                'cursor': changes.current_cursor(),
+                'has_more': False,
+                'changes': [],
+            })
+        try:
+            since = int(params['since'])
+            limit = min(int(params.get('limit', changes.BATCH_SIZE)),
+                        self.max_limit)
+        except ValueError:
+            since = limit = -1
+        if since < 0 or limit < 1:
+            return Response(
+                {'errors': 'since и limit должны быть целыми числами, '
+                           'limit от 1 до 1000'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            deltas, cursor, has_more = changes.changes_since(
+                since, request.user, limit
+            )
+        except changes.ExpiredCursorError:
+            return Response(
+                {'errors': 'Курсор устарел, загрузите данные заново'},
+                status=status.HTTP_410_GONE
+            )
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'changes': self.serialize(deltas),
+        })
+
+    def get_objects(self, kind, ids):
+        """
+        Сериализованные объекты kind с id из ids одним запросом.
+        """
+        if kind == Change.RECIPE:
+            queryset = recipes_for_reading(
+                Recipe.objects.filter(pk__in=ids), self.request
+            )
+            serializer_class = RecipeSerializer
+        else:
+            model, serializer_class = self.object_serializers[kind]
+            queryset = model.objects.filter(pk__in=ids)
+        data = serializer_class(
+            queryset, many=True, context={'request': self.request}
+        ).data
+        return {item['id']: item for item in data}
+
+    def serialize(self, deltas):
+        with_data = {Change.RECIPE, *self.object_serializers}
+        upserts = {}
+        for kind, object_id, deleted in deltas:
+            if kind in with_data and not deleted:
+                upserts.setdefault(kind, []).append(object_id)
+        objects = {
+            kind: self.get_objects(kind, ids) for kind, ids in upserts.items()
+        }
+        result = []
+        for kind, object_id, deleted in deltas:
+            item = {'type': kind, 'id': object_id}
+            if kind in objects:
+                data = objects[kind].get(object_id)
+                # Объект удалён после изменения: tombstone ещё впереди.
+                deleted = deleted or data is None
+                if not deleted:
+                    item['data'] = data
+            item['op'] = 'delete' if deleted else 'upsert'
+            result.append(item)
+        return result
+
+
+class ProfilesViewSet(viewsets.ViewSet):
+    """
+    Профили запросов, снятые по X-Profile или ?_profile=
+    (см. api/profiling.py): список и скачивание файла. Только для
+    сотрудников.
+    """
+    permission_classes = (IsAdminUser,)
+    lookup_value_regex = profiling.PROFILE_ID_RE
+
+    def list(self, request):
+        return Response(profiling.profiles())
+
+    def retrieve(self, request, pk=None):
+        meta = profiling.load_meta(pk)
+        if meta is not None:
+            try:
+                return FileResponse(
+                    open(profiling.profile_path(meta), 'rb'),
+                    as_attachment=True,
+                    filename=meta['file'],
+                )
+            except FileNotFoundError:
+                # Профиль удалён из кольца после чтения описания.
+                pass
+        return Response(
+            {'errors': 'Профиль не найден'},
+            status=status.HTTP_404_NOT_FOUND
+        )
@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импорт после настройки Django.
+from api.sse import EVENTS_PATH, events_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Поток событий SSE обслуживается отдельным ASGI-приложением,
+    остальные запросы — Django.
+    """
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await events_application(scope, receive, send)
+    return await django_application(scope, receive, send)
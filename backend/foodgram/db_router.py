@@ -0,0 +1,69 @@
+"""
+Маршрутизация чтения на реплики базы данных.
+
+Чтение уходит на реплику только между route_reads_to_replica() и
+reset_read_routing() (так делают представления API для безопасных
+запросов), всё остальное работает с основной базой. После записи
+пользователь на REPLICA_PIN_SECONDS закрепляется за основной базой,
+чтобы сразу видеть свои изменения, несмотря на отставание реплик.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PIN_KEY = 'replica_pin:{}'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pin_primary(user):
+    """
+    Закрепление пользователя за основной базой после записи (без
+    реплик закреплять не за чем).
+    """
+    if get_replicas() and user.is_authenticated:
+        cache.set(PIN_KEY.format(user.pk), True,
+                  getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+
+
+def is_pinned(user):
+    return (user.is_authenticated
+            and cache.get(PIN_KEY.format(user.pk), False))
+
+
+def route_reads_to_replica(user=None):
+    """
+    Направление чтения в случайную реплику (одну на весь запрос), если
+    реплики настроены и пользователь не закреплён за основной базой.
+    Возвращает токен для reset_read_routing() или None.
+    """
+    replicas = get_replicas()
+    if not replicas or (user is not None and is_pinned(user)):
+        return None
+    return _read_alias.set(random.choice(replicas))
+
+
+def reset_read_routing(token):
+    if token is not None:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *get_replicas()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
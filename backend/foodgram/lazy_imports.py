@@ -0,0 +1,19 @@
+"""
+Отключение необязательных модулей, замедляющих запуск.
+
+rest_framework.compat при импорте подгружает coreapi и coreschema
+(а с ними pkg_resources, requests и jinja2) ради генерации схем
+CoreAPI, которой проект не пользуется. Пакеты установлены как
+зависимости djoser, поэтому до загрузки DRF они помечаются
+в sys.modules как отсутствующие, и DRF работает без них.
+importlib.util.LazyLoader здесь не помогает: повторный import
+обращается к __spec__ модуля и сразу исполняет его.
+"""
+import sys
+
+SKIPPED_MODULES = ('coreapi', 'coreschema')
+
+
+def skip_optional_modules(names=SKIPPED_MODULES):
+    for name in names:
+        sys.modules.setdefault(name, None)
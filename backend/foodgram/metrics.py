@@ -0,0 +1,459 @@
+"""
+Метрики приложения в текстовом формате Prometheus: GET /metrics.
+
+Счётчики и гистограммы объявлены в конце модуля. Хранилище значений
+задаётся METRICS_BACKEND:
+    local — словарь в памяти процесса; /metrics показывает только
+            воркер, который ответил на запрос;
+    file  — у каждого процесса свой файл в METRICS_DIR, отображённый в
+            память (mmap): обновление значения — запись в память без
+            системных вызовов, а /metrics суммирует файлы всех воркеров.
+
+Файл процесса заблокирован (flock), пока процесс жив. Новый процесс
+переносит значения из файлов завершившихся воркеров (например, после
+перезапуска по max_requests) в общий архив, поэтому счётчики не
+убывают, а число файлов не растёт.
+
+/metrics доступен только адресам из METRICS_ALLOWED_IPS.
+"""
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Файл значений: 8 байт заголовка (занятый размер), затем записи:
+# длина ключа, ключ с выравниванием до 8 байт, значение double.
+HEADER = struct.Struct('<Q')
+LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+SUFFIX = '.db'
+ARCHIVE = 'archive' + SUFFIX
+LOCK = '.lock'
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+def padded_length(length):
+    return length + (-(length + LENGTH.size)) % 8
+
+
+def read_entries(buffer):
+    """
+    Записи файла значений: (ключ, смещение значения, значение).
+    """
+    used = HEADER.unpack_from(buffer, 0)[0] if len(buffer) else 0
+    position = HEADER.size
+    while position < used:
+        length = LENGTH.unpack_from(buffer, position)[0]
+        start = position + LENGTH.size
+        key = bytes(buffer[start:start + length]).decode()
+        position = start + padded_length(length)
+        yield key, position, VALUE.unpack_from(buffer, position)[0]
+        position += VALUE.size
+
+
+class LocalValues:
+
+    def __init__(self):
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def add(self, key, amount):
+        with self.lock:
+            self.values[key] += amount
+
+    def collect(self):
+        with self.lock:
+            return dict(self.values)
+
+
+class ValuesFile:
+    """
+    Файл значений, отображённый в память. Пишет в него только один
+    процесс, поэтому обновления защищены обычной блокировкой потоков.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = os.fstat(self.fd).st_size
+        if size < INITIAL_SIZE:
+            os.ftruncate(self.fd, INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self.map = mmap.mmap(self.fd, size)
+        self.positions = {}
+        self.used = HEADER.size
+        for key, position, _ in read_entries(self.map):
+            self.positions[key] = position
+            self.used = position + VALUE.size
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self.allocate(key)
+            value = VALUE.unpack_from(self.map, position)[0]
+            VALUE.pack_into(self.map, position, value + amount)
+
+    def allocate(self, key):
+        encoded = key.encode()
+        position = self.used + LENGTH.size + padded_length(len(encoded))
+        end = position + VALUE.size
+        if end > len(self.map):
+            self.grow(end)
+        LENGTH.pack_into(self.map, self.used, len(encoded))
+        start = self.used + LENGTH.size
+        self.map[start:start + len(encoded)] = encoded
+        VALUE.pack_into(self.map, position, 0.0)
+        # Заголовок обновляется последним: читатели не видят
+        # недописанную запись.
+        HEADER.pack_into(self.map, 0, end)
+        self.used = end
+        self.positions[key] = position
+        return position
+
+    def grow(self, needed):
+        size = len(self.map)
+        while size < needed:
+            size *= 2
+        self.map.close()
+        os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+class FileValues:
+    """
+    Значения процесса в METRICS_DIR/<pid>.db, сбор — по всем файлам.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}{SUFFIX}')
+        while True:
+            self.file = ValuesFile(path)
+            fcntl.flock(self.file.fd, fcntl.LOCK_EX)
+            # Пока ждали блокировку, файл мог перенести в архив другой
+            # процесс: тогда открываем новый.
+            if os.path.exists(path) and os.path.samestat(
+                os.stat(path), os.fstat(self.file.fd)
+            ):
+                break
+            self.file.close()
+        self.archive_dead()
+
+    @contextmanager
+    def locked(self, operation):
+        fd = os.open(os.path.join(self.directory, LOCK),
+                     os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)
+
+    def paths(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith(SUFFIX)
+        ]
+
+    def archive_dead(self):
+        """
+        Перенос значений завершившихся процессов в архив.
+        """
+        with self.locked(fcntl.LOCK_EX):
+            archive = None
+            for path in self.paths():
+                if path in (self.file.path,
+                            os.path.join(self.directory, ARCHIVE)):
+                    continue
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Процесс жив.
+                    os.close(fd)
+                    continue
+                if archive is None:
+                    archive = ValuesFile(
+                        os.path.join(self.directory, ARCHIVE)
+                    )
+                with open(path, 'rb') as source:
+                    for key, _, value in read_entries(source.read()):
+                        archive.add(key, value)
+                os.unlink(path)
+                os.close(fd)
+            if archive is not None:
+                archive.close()
+
+    def add(self, key, amount):
+        self.file.add(key, amount)
+
+    def collect(self):
+        totals = defaultdict(float)
+        # Общая блокировка: перенос в архив не выполняется, и значения
+        # не считаются дважды.
+        with self.locked(fcntl.LOCK_SH):
+            for path in self.paths():
+                try:
+                    with open(path, 'rb') as file:
+                        data = file.read()
+                except FileNotFoundError:
+                    continue
+                for key, _, value in read_entries(data):
+                    totals[key] += value
+        return totals
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Хранилище значений текущего процесса. После fork (gunicorn
+    загружает приложение до запуска воркеров) создаётся заново.
+    """
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        with _store_lock:
+            if _store_pid != pid:
+                if settings.METRICS_BACKEND == 'file' and fcntl is not None:
+                    _store = FileValues(settings.METRICS_DIR)
+                else:
+                    _store = LocalValues()
+                _store_pid = pid
+    return _store
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def escape(value):
+    return (value.replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        f'{name}="{escape(value)}"' for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # Ключи хранилища по значениям меток: их немного (маршруты,
+        # области), а json.dumps на каждое обновление заметно дороже.
+        self.keys = {}
+        registry.append(self)
+
+    def label_values(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def add(self, sample, values, amount):
+        key = self.keys.get((sample, values))
+        if key is None:
+            key = self.keys[sample, values] = json.dumps(
+                [sample, values], ensure_ascii=False
+            )
+        get_store().add(key, amount)
+
+    def header(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.add(self.name, self.label_values(labels), amount)
+
+    def expose(self, samples):
+        return [
+            f'{self.name}{format_labels(self.labels, values)} '
+            f'{format_value(value)}'
+            for values, value in sorted(samples.get(self.name, ()))
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.bounds = [format_value(bound) for bound in self.buckets]
+        self.bounds.append('+Inf')
+
+    def observe(self, value, **labels):
+        values = self.label_values(labels)
+        bound = self.bounds[bisect_left(self.buckets, value)]
+        self.add(f'{self.name}_bucket', (*values, bound), 1)
+        self.add(f'{self.name}_sum', values, value)
+        self.add(f'{self.name}_count', values, 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, **labels)
+
+    def expose(self, samples):
+        buckets = defaultdict(dict)
+        for values, value in samples.get(f'{self.name}_bucket', ()):
+            buckets[tuple(values[:-1])][values[-1]] = value
+        totals = {
+            tuple(values): value
+            for values, value in samples.get(f'{self.name}_sum', ())
+        }
+        lines = []
+        names = (*self.labels, 'le')
+        for values in sorted(buckets):
+            count = 0
+            for bound in self.bounds:
+                count += buckets[values].get(bound, 0)
+                lines.append(
+                    f'{self.name}_bucket'
+                    f'{format_labels(names, (*values, bound))} '
+                    f'{format_value(count)}'
+                )
+            labels = format_labels(self.labels, values)
+            lines.append(
+                f'{self.name}_sum{labels} '
+                f'{format_value(totals.get(values, 0))}'
+            )
+            lines.append(f'{self.name}_count{labels} {format_value(count)}')
+        return lines
+
+
+registry = []
+
+
+def render():
+    """
+    Все метрики в текстовом формате Prometheus.
+    """
+    samples = defaultdict(list)
+    for key, value in get_store().collect().items():
+        sample, values = json.loads(key)
+        samples[sample].append((values, value))
+    lines = []
+    for metric in registry:
+        lines += metric.header()
+        lines += metric.expose(samples)
+    return '\n'.join(lines) + '\n'
+
+
+def is_allowed(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_IPS.split(',')
+        if network.strip()
+    )
+
+
+def metrics_view(request):
+    """
+    GET /metrics для Prometheus. Адрес проверяется по REMOTE_ADDR:
+    nginx этот путь не проксирует, Prometheus обращается к бэкенду
+    напрямую.
+    """
+    if not is_allowed(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total',
+    'Запросы по имени маршрута, методу и статусу ответа.',
+    ('route', 'method', 'status'),
+)
+REQUEST_SECONDS = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса (для потоковых ответов — до начала потока).',
+    ('route', 'method'),
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Количество запросов к базе данных за запрос.',
+    ('route',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_SECONDS = Counter(
+    'foodgram_db_query_seconds_total',
+    'Суммарное время запросов к базе данных.',
+    ('route',),
+)
+SERIALIZER_SECONDS = Histogram(
+    'foodgram_serializer_seconds',
+    'Время сериализации списков верхнего уровня.',
+    ('serializer',),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшу: hit или miss.',
+    ('cache', 'result'),
+)
+IMAGE_SECONDS = Histogram(
+    'foodgram_image_seconds',
+    'Обработка картинок: decode — base64 и проверка Pillow, store — '
+    'хеширование и запись в хранилище.',
+    ('operation',),
+)
+THROTTLE_REQUESTS = Counter(
+    'foodgram_throttle_requests_total',
+    'Проверки ограничения частоты: allowed или throttled.',
+    ('scope', 'result'),
+)
+
+
+def count_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
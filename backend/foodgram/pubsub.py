@@ -0,0 +1,152 @@
+"""
+Публикация событий для живых обновлений (SSE, см. api/sse.py).
+
+publish() отправляет событие после фиксации текущей транзакции. С
+PostgreSQL событие уходит через NOTIFY и доходит до всех воркеров:
+каждый слушает канал одним соединением (LISTEN), которое читается
+прямо в цикле событий ASGI-сервера. Без PostgreSQL (SQLite при
+разработке) работает локальная замена: событие получают только
+подписчики того же процесса.
+
+Доставка не гарантируется: события, отправленные, пока слушатель
+переподключается, теряются. Клиент досинхронизируется через
+/api/changes/.
+"""
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+CHANNEL = 'foodgram_events'
+RECONNECT_DELAY = 5
+
+logger = logging.getLogger(__name__)
+
+
+def use_postgres():
+    broker = settings.EVENTS_BROKER
+    if broker == 'auto':
+        return connections['default'].vendor == 'postgresql'
+    return broker == 'postgres'
+
+
+def publish(event):
+    """
+    Отправка события после фиксации транзакции (сразу, если её нет).
+    event — словарь или функция, которая вернёт его после фиксации
+    (например, чтобы посчитать актуальные счётчики).
+    """
+    if not settings.EVENTS_ENABLED:
+        return
+    if not use_postgres() and hub.loop is None:
+        # Локальная замена: в этом процессе нет подписчиков.
+        return
+    transaction.on_commit(lambda: send(event() if callable(event) else event))
+
+
+def send(event):
+    payload = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+    if not use_postgres():
+        hub.dispatch_threadsafe(payload)
+        return
+    try:
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+    except DatabaseError:
+        logger.exception('Не удалось отправить событие %s', payload)
+
+
+class PostgresListener:
+    """
+    LISTEN на отдельном соединении psycopg2 без блокировки цикла
+    событий: уведомления читаются по готовности сокета.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def connect(self):
+        import psycopg2.extensions
+
+        params = connections['default'].get_connection_params()
+        connection = psycopg2.connect(**params)
+        connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return connection
+
+    def poll(self, connection, lost):
+        try:
+            connection.poll()
+        except Exception as error:
+            if not lost.done():
+                lost.set_exception(error)
+            return
+        while connection.notifies:
+            self.hub.dispatch(connection.notifies.pop(0).payload)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                connection = await loop.run_in_executor(None, self.connect)
+            except Exception:
+                logger.exception('Нет соединения для LISTEN')
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            lost = loop.create_future()
+            loop.add_reader(
+                connection.fileno(), self.poll, connection, lost
+            )
+            try:
+                await lost
+            except Exception:
+                logger.exception('Соединение LISTEN потеряно')
+            finally:
+                loop.remove_reader(connection.fileno())
+                connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+class Hub:
+    """
+    Подписчики событий текущего процесса. Работает в цикле событий
+    ASGI-сервера; слушатель PostgreSQL запускается при первой подписке.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.handlers = set()
+        self.listener = None
+
+    def subscribe(self, handler):
+        self.loop = asyncio.get_running_loop()
+        if self.listener is None and use_postgres():
+            self.listener = self.loop.create_task(
+                PostgresListener(self).run()
+            )
+        self.handlers.add(handler)
+
+    def unsubscribe(self, handler):
+        self.handlers.discard(handler)
+
+    def dispatch(self, payload):
+        event = json.loads(payload)
+        for handler in list(self.handlers):
+            handler(event)
+
+    def dispatch_threadsafe(self, payload):
+        """
+        Доставка из синхронного кода (представления Django выполняются
+        в отдельном потоке).
+        """
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.dispatch, payload)
+
+
+hub = Hub()
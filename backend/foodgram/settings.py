@@ -13,8 +13,15 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from foodgram.lazy_imports import skip_optional_modules
+
 load_dotenv()
 
+# Схемы CoreAPI не используются, а их импорт — самая долгая часть
+# запуска (см. foodgram/lazy_imports.py).
+if os.getenv('COREAPI_ENABLED') != 'True':
+    skip_optional_modules()
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,14 +48,19 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
+    'tasks.apps.TasksConfig',
+    'stats.apps.StatsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +96,41 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+    }
+}
+
+# Реплики только для чтения: DB_REPLICAS — адреса (HOST) реплик через
+# пробел, для SQLite — пути к файлам баз (NAME).
+
+REPLICA_DATABASES = []
+for number, replica in enumerate(os.getenv('DB_REPLICAS', '').split(), 1):
+    alias = f'replica_{number}'
+    setting = 'NAME' if 'sqlite3' in (os.getenv('DB_ENGINE') or '') else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        setting: replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной базы.
+# Для нескольких воркеров нужен общий для них кэш (CACHES).
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+# Общий для воркеров кэш: закрепление за основной базой, списки покупок
+# плана питания.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram-cache'),
     }
 }
 
@@ -115,10 +162,43 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
+# Ограничение частоты запросов (api.throttling): ёмкость корзины в токенах,
+# пополнение токенов в секунду и хранилище состояния (local — в памяти
+# воркера, file — общий для воркеров файл в THROTTLE_FILE_DIR).
+
+THROTTLE_BUCKETS = {
+    'default': {'capacity': 60, 'refill_rate': 1, 'backend': 'file'},
+    'catalog': {'capacity': 100, 'refill_rate': 20, 'backend': 'local'},
+    'users': {'capacity': 60, 'refill_rate': 1, 'backend': 'file'},
+    'recipes': {'capacity': 120, 'refill_rate': 2, 'backend': 'file'},
+}
+
+THROTTLE_FILE_DIR = os.getenv('THROTTLE_FILE_DIR', '/tmp/foodgram-throttle')
+
+# Сжатие ответов (api.middleware.CompressionMiddleware): ответы меньше
+# COMPRESSION_MIN_SIZE байт отдаются как есть.
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
 
 DJOSER = {
     'SERIALIZERS': {
@@ -134,6 +214,94 @@ DJOSER = {
     'HIDE_USERS': False,
 }
 
+# Лента подписок: начиная с этого количества подписок лента пользователя
+# материализуется в таблице FeedInbox вместо слияния на чтении.
+
+FEED_INBOX_THRESHOLD = int(os.getenv('FEED_INBOX_THRESHOLD', 200))
+
+# Фоновые задачи (приложение tasks, воркер: manage.py run_worker).
+# При TASKS_ALWAYS_EAGER задачи выполняются сразу, без очереди.
+
+TASKS_ALWAYS_EAGER = os.getenv('TASKS_ALWAYS_EAGER') == 'True'
+
+TASKS_LOCK_TIMEOUT = int(os.getenv('TASKS_LOCK_TIMEOUT', 600))
+
+# Сколько дней хранятся выполненные задачи с ключом идемпотентности:
+# в этом окне повторная постановка с тем же ключом игнорируется.
+
+TASKS_DONE_RETENTION_DAYS = int(os.getenv('TASKS_DONE_RETENTION_DAYS', 7))
+
+# Сколько секунд прокси и браузеры могут кэшировать публичные ответы
+# (рецепт или профиль, запрошенные анонимно).
+
+PUBLIC_CACHE_SECONDS = int(os.getenv('PUBLIC_CACHE_SECONDS', 60))
+
+# Сколько секунд хранится недельный список покупок плана питания
+# (при изменении плана или рецептов он сбрасывается сразу).
+
+MEAL_PLAN_CACHE_SECONDS = int(os.getenv('MEAL_PLAN_CACHE_SECONDS', 7 * 86400))
+
+# Журнал изменений для синхронизации клиентов (GET /api/changes/):
+# записи моложе CHANGES_SETTLE_SECONDS ещё не отдаются (с PostgreSQL и
+# SQLite порядок записей гарантирует блокировка журнала, окно нужно
+# только другим СУБД), старше CHANGES_RETENTION_DAYS удаляет команда
+# prune_changes.
+
+CHANGES_SETTLE_SECONDS = int(os.getenv('CHANGES_SETTLE_SECONDS', 2))
+
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', 30))
+
+# Живые обновления по SSE (api/sse.py, только под ASGI:
+# GUNICORN_WORKER_CLASS=uvicorn). EVENTS_BROKER: auto — PostgreSQL
+# LISTEN/NOTIFY, если база PostgreSQL, иначе local (в пределах процесса).
+
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED') == 'True'
+
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'auto')
+
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+
+EVENTS_MAX_CONNECTIONS = int(os.getenv('EVENTS_MAX_CONNECTIONS', 10000))
+
+EVENTS_MAX_RECIPES = int(os.getenv('EVENTS_MAX_RECIPES', 100))
+
+# Статистика (приложение stats, агрегация: manage.py rollup_stats).
+# События моложе STATS_ROLLUP_LAG_SECONDS ждут следующего прохода,
+# почасовые агрегаты хранятся STATS_HOURLY_RETENTION_HOURS часов.
+
+STATS_ROLLUP_LAG_SECONDS = int(os.getenv('STATS_ROLLUP_LAG_SECONDS', 60))
+
+STATS_HOURLY_RETENTION_HOURS = int(
+    os.getenv('STATS_HOURLY_RETENTION_HOURS', 72)
+)
+
+# Профилирование запросов сотрудниками по заголовку X-Profile или
+# параметру ?_profile= (api/profiling.py): последние PROFILING_KEEP
+# профилей хранятся в PROFILING_DIR.
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+
+PROFILING_DIR = os.getenv('PROFILING_DIR', '/tmp/foodgram-profiles')
+
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 50))
+
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', 1))
+
+# Метрики Prometheus (foodgram/metrics.py, GET /metrics): file — общие
+# для воркеров файлы в METRICS_DIR, local — в памяти процесса.
+# METRICS_ALLOWED_IPS — адреса и сети через запятую, которым доступен
+# /metrics.
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+
+METRICS_BACKEND = os.getenv('METRICS_BACKEND', 'file')
+
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/foodgram-metrics')
+
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1')
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -0,0 +1,60 @@
+"""
+Прогрев приложения при запуске gunicorn.
+
+warm_up() выполняется в мастер-процессе до форка воркеров (preload_app),
+поэтому импорт модулей, построение URL-резолвера, метаданных моделей
+и классов из настроек DRF оплачиваются один раз, а память делится между
+воркерами copy-on-write. Там же открываются соединения с базами
+(модули драйвера загружаются, ошибки настроек видны сразу) и
+загружается снимок справочников тегов и ингредиентов
+(recipes/catalogue.py). Прогрев только читает: миграции при деплое
+выполняются уже после запуска.
+"""
+import logging
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.urls import resolve
+from rest_framework.settings import api_settings
+
+from recipes.catalogue import get_catalogue
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_PATHS = (
+    '/api/recipes/',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/users/',
+)
+
+WARM_UP_API_SETTINGS = (
+    'DEFAULT_RENDERER_CLASSES',
+    'DEFAULT_PARSER_CLASSES',
+    'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES',
+    'DEFAULT_THROTTLE_CLASSES',
+    'DEFAULT_PAGINATION_CLASS',
+)
+
+
+def warm_up_database():
+    for connection in connections.all():
+        connection.ensure_connection()
+    get_catalogue()
+
+
+def warm_up():
+    for path in WARM_UP_PATHS:
+        resolve(path)
+    for model in apps.get_models():
+        model._meta.get_fields()
+    for name in WARM_UP_API_SETTINGS:
+        getattr(api_settings, name)
+    try:
+        warm_up_database()
+    except DatabaseError:
+        # Воркеры подключатся сами, когда база станет доступна.
+        logger.warning('Прогрев базы данных не выполнен', exc_info=True)
+    # Соединения мастера не должны достаться воркерам после форка.
+    connections.close_all()
@@ -0,0 +1,80 @@
+"""
+Настройки gunicorn. Количество воркеров и потоков считается по числу
+доступных контейнеру CPU и переопределяется переменными окружения:
+
+GUNICORN_WORKER_CLASS  gthread (по умолчанию), sync или uvicorn
+GUNICORN_WORKERS       число воркеров (по умолчанию 2 * CPU + 1)
+GUNICORN_THREADS       потоков в воркере gthread (по умолчанию 4)
+GUNICORN_MAX_REQUESTS  перезапуск воркера после N запросов (1000)
+"""
+import multiprocessing
+import os
+
+
+def cpu_limit():
+    """
+    Число CPU с учётом квоты cgroup и привязки процесса к ядрам.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = multiprocessing.cpu_count()
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != 'max':
+            count = min(count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return count
+
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+worker_type = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_type == 'uvicorn':
+    # uvicorn есть в requirements.txt: без него запуск падает, а не
+    # переходит молча на gthread.
+    import uvicorn  # noqa: F401
+elif os.getenv('EVENTS_ENABLED') == 'True':
+    # Поток /api/events/ обслуживает только ASGI-приложение: под
+    # WSGI-воркером nginx направлял бы его в Django и получал 404.
+    raise RuntimeError(
+        'EVENTS_ENABLED=True требует GUNICORN_WORKER_CLASS=uvicorn'
+    )
+
+worker_class = WORKER_CLASSES[worker_type]
+wsgi_app = (
+    'foodgram.asgi:application' if worker_type == 'uvicorn'
+    else 'foodgram.wsgi:application'
+)
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2 * cpu_limit() + 1))
+threads = int(os.getenv(
+    'GUNICORN_THREADS', 4 if worker_type == 'gthread' else 1
+))
+
+# Приложение импортируется один раз в мастере до форка воркеров.
+preload_app = True
+
+# Перезапуск воркеров со случайным разбросом, чтобы они не
+# перезапускались одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Держим соединения nginx открытыми дольше, чем keepalive_timeout
+# пула upstream.
+keepalive = 75
+
+accesslog = '-'
+
+
+def when_ready(server):
+    from foodgram.warmup import warm_up
+    warm_up()
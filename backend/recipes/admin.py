@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.admin import display
 
+from . import planning
+from .deletion import delete_recipes
 from .models import (
     Tag,
     Ingredient,
@@ -8,7 +10,9 @@ from .models import (
     Recipe,
     Favorite,
     ShoppingCart,
+    MealPlan,
 )
+from .signals import ingredients_changed
 
 
 class AmountIngredientInline(admin.TabularInline):
@@ -35,6 +39,32 @@ class RecipeAdmin(admin.ModelAdmin):
     def added_in_favorites(self, obj):
         return obj.favorites.count()
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        planning.invalidate_recipes([form.instance.pk])
+
+    def delete_model(self, request, obj):
+        delete_recipes(Recipe.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(queryset)
+
+
+class AmountIngredientAdmin(admin.ModelAdmin):
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ingredients_changed([obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ingredients_changed([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        ingredients_changed(recipe_ids)
+
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = (
@@ -49,7 +79,8 @@ class IngredientAdmin(admin.ModelAdmin):
 
 admin.site.register(Tag)
 admin.site.register(Ingredient, IngredientAdmin)
-admin.site.register(AmountIngredient)
+admin.site.register(AmountIngredient, AmountIngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Favorite)
 admin.site.register(ShoppingCart)
+admin.site.register(MealPlan)
@@ -0,0 +1,101 @@
+"""
+Справочники тегов и ингредиентов в памяти процесса.
+
+Тегов несколько, ингредиентов около двух тысяч, меняются они редко, а
+нужны при каждой записи рецепта (проверка id) и при выводе его
+ингредиентов (название и единица измерения). Снимок справочников
+загружается один раз и используется, пока не изменится версия в
+CatalogueVersion: её увеличивают сигналы при любом изменении тегов и
+ингредиентов в той же транзакции. Версия сверяется одним запросом
+к единственной строке, не чаще раза за запрос API.
+"""
+import threading
+from collections import namedtuple
+
+from django.db.models import F
+
+from foodgram.metrics import count_cache
+
+from .models import CatalogueVersion, Ingredient, Tag
+
+VERSION_PK = 1
+
+
+class Catalogue(namedtuple('Catalogue', ('version', 'tags', 'ingredients'))):
+    """
+    Снимок справочников: словари id → объект. Объекты общие для всех
+    потоков процесса, изменять их нельзя.
+    """
+
+    def ingredient(self, pk):
+        ingredient = self.ingredients.get(pk)
+        if ingredient is None:
+            # Строка создана в обход сигналов (bulk_create) или версия
+            # прочитана с отстающей реплики.
+            ingredient = Ingredient.objects.get(pk=pk)
+        return ingredient
+
+    def unknown_ingredients(self, ids):
+        """
+        id из ids, которых нет ни в снимке, ни в базе (строки, созданные
+        в обход сигналов, например bulk_create, ищутся в базе).
+        """
+        missing = set(ids) - self.ingredients.keys()
+        if missing:
+            missing -= set(Ingredient.objects.filter(
+                pk__in=missing
+            ).values_list('pk', flat=True))
+        return missing
+
+
+_catalogue = Catalogue(-1, {}, {})
+_lock = threading.Lock()
+
+
+def current_version():
+    return CatalogueVersion.objects.filter(pk=VERSION_PK).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+def bump():
+    """
+    Новая версия справочников после изменения тегов или ингредиентов.
+    """
+    if not CatalogueVersion.objects.filter(pk=VERSION_PK).update(
+        version=F('version') + 1
+    ):
+        CatalogueVersion.objects.get_or_create(
+            pk=VERSION_PK, defaults={'version': 1}
+        )
+
+
+def load(version):
+    return Catalogue(
+        version, Tag.objects.in_bulk(), Ingredient.objects.in_bulk()
+    )
+
+
+def get_catalogue(request=None):
+    """
+    Актуальный снимок справочников. С request снимок запоминается в
+    запросе, и версия больше не сверяется до его конца.
+    """
+    global _catalogue
+    if request is not None:
+        cached = getattr(request, '_catalogue', None)
+        if cached is not None:
+            return cached
+    # Версия читается до строк: если справочники изменятся во время
+    # загрузки, следующая сверка увидит новую версию.
+    version = current_version()
+    catalogue = _catalogue
+    count_cache('catalogue', version <= catalogue.version)
+    if version > catalogue.version:
+        with _lock:
+            if version > _catalogue.version:
+                _catalogue = load(version)
+            catalogue = _catalogue
+    if request is not None:
+        request._catalogue = catalogue
+    return catalogue
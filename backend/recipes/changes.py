@@ -0,0 +1,169 @@
+"""
+Журнал изменений для синхронизации клиентов.
+
+Каждое изменение рецепта, тега, ингредиента, избранного, списка покупок
+или подписки записывается в Change в той же транзакции, что и сами
+данные. Клиент хранит курсор — id последней полученной записи — и
+запрашивает только более новые (GET /api/changes/?since=<курсор>).
+Несколько изменений одного объекта в пачке сворачиваются в последнее:
+upsert (объект нужно перечитать) или tombstone (объект удалён).
+
+id выдаются до фиксации транзакций, и без упорядочивания запись с
+меньшим id могла бы стать видна позже записи с большим, а курсор
+клиента — перепрыгнуть через неё навсегда. Поэтому записи в журнал
+сериализованы: с PostgreSQL транзакция берёт транзакционную
+advisory-блокировку перед первой записью и держит её до фиксации, в
+SQLite пишущая транзакция и так одна. id становятся видны в порядке
+возрастания, независимо от длительности транзакций. Чтобы блокировка
+держалась недолго, журнал пишется последним действием транзакции:
+внутри changes.atomic() записи копятся на соединении и пишутся одним
+запросом перед фиксацией (API записи рецептов, избранного, списка
+покупок и подписок). Вне её запись идёт сразу.
+Записи моложе CHANGES_SETTLE_SECONDS дополнительно не отдаются (для
+других СУБД).
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Change
+
+BATCH_SIZE = 500
+# Ключ advisory-блокировки журнала в PostgreSQL.
+LOCK_KEY = 0x666f6f64
+
+Delta = namedtuple('Delta', ('kind', 'object_id', 'deleted'))
+
+
+class ExpiredCursorError(Exception):
+    """
+    Записи после курсора уже удалены из журнала: клиенту нужна полная
+    синхронизация.
+    """
+
+
+def log(kind, object_ids, user_id=None, deleted=False):
+    """
+    Запись изменений объектов kind с id из object_ids: сразу или, внутри
+    atomic(), при выходе из неё.
+    """
+    rows = [
+        Change(kind=kind, object_id=object_id, user_id=user_id,
+               deleted=deleted)
+        for object_id in object_ids
+    ]
+    using = router.db_for_write(Change)
+    pending = getattr(connections[using], 'pending_changes', None)
+    if pending is not None:
+        pending.extend(rows)
+    elif rows:
+        write(rows, using)
+
+
+def write(rows, using):
+    """
+    Вставка записей журнала. Блокировка журнала держится до конца
+    внешней транзакции.
+    """
+    with transaction.atomic(using=using, savepoint=False):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+        Change.objects.using(using).bulk_create(rows)
+
+
+@contextmanager
+def atomic():
+    """
+    transaction.atomic, записи журнала внутри которой пишутся одним
+    запросом при выходе из неё, перед фиксацией. Вложенный блок
+    копит записи во внешний.
+    """
+    using = router.db_for_write(Change)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if getattr(connection, 'pending_changes', None) is not None:
+            yield
+            return
+        connection.pending_changes = []
+        try:
+            yield
+            rows = connection.pending_changes
+        finally:
+            connection.pending_changes = None
+        if rows:
+            write(rows, using)
+
+
+def settle_cutoff():
+    """
+    Изменения раньше этого времени наверняка зафиксированы.
+    """
+    return timezone.now() - timedelta(
+        seconds=settings.CHANGES_SETTLE_SECONDS
+    )
+
+
+def current_cursor():
+    """
+    Курсор для клиента, который только что загрузил данные целиком.
+    """
+    return Change.objects.filter(
+        created_at__lt=settle_cutoff()
+    ).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def changes_since(since, user, limit=BATCH_SIZE):
+    """
+    Изменения после курсора since, видимые пользователю user.
+    Возвращает (список Delta, новый курсор, есть ли ещё изменения).
+    """
+    oldest = Change.objects.order_by('id').values_list(
+        'id', flat=True
+    ).first()
+    if oldest is not None and since + 1 < oldest:
+        raise ExpiredCursorError
+    visible = Q(user__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+    rows = list(Change.objects.filter(visible, id__gt=since).order_by(
+        'id'
+    ).values_list('id', 'kind', 'object_id', 'deleted', 'created_at')[
+        :limit + 1
+    ])
+    has_more = len(rows) > limit
+    del rows[limit:]
+    cutoff = settle_cutoff()
+    for index, row in enumerate(rows):
+        if row[4] >= cutoff:
+            del rows[index:]
+            has_more = False
+            break
+    latest = {}
+    for _, kind, object_id, deleted, _ in rows:
+        # Повторное изменение объекта переносит его в конец.
+        latest.pop((kind, object_id), None)
+        latest[kind, object_id] = deleted
+    deltas = [
+        Delta(kind, object_id, deleted)
+        for (kind, object_id), deleted in latest.items()
+    ]
+    return deltas, rows[-1][0] if rows else since, has_more
+
+
+def prune(retention=None):
+    """
+    Удаление записей журнала старше retention (по умолчанию
+    CHANGES_RETENTION_DAYS дней).
+    """
+    if retention is None:
+        retention = timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    return Change.objects.filter(
+        created_at__lt=timezone.now() - retention
+    ).delete()[0]
@@ -0,0 +1,98 @@
+"""
+Быстрое удаление рецептов и пользователей.
+
+Model.delete() собирает каскад в Python: загружает в память все
+связанные объекты (избранное, списки покупок, ингредиенты, теги,
+подписки, ленты) и удаляет их пачками с отправкой сигналов. Для
+автора с тысячами рецептов это десятки тысяч объектов и запросов.
+
+bulk_delete() удаляет зависимые строки запросами DELETE ... WHERE
+fk IN (подзапрос) в порядке внешних ключей, без загрузки объектов и
+без сигналов pre_delete/post_delete. Побочные эффекты сигналов
+выполняются здесь явно: картинки удаляются фоновой задачей, недельные
+списки покупок планов питания сбрасываются из кэша, удаления
+записываются в журнал изменений, а строки материализованных лент
+удаляются каскадом вместе с рецептами и подписками. Если у связи
+правило on_delete, отличное от CASCADE, SET_NULL и DO_NOTHING, удаление
+передаётся стандартному сборщику.
+"""
+from django.db import models, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+from tasks.registry import enqueue_on_commit
+from users.models import Subscriptions
+
+from . import changes, planning, tasks
+from .models import Change, Recipe
+
+CHUNK_SIZE = 500
+
+
+def bulk_delete(queryset):
+    """
+    Удаление строк queryset и всех каскадно зависимых строк.
+    Возвращает количество удалённых строк queryset.
+    """
+    model = queryset.model
+    relations = list(get_candidate_relations_to_delete(model._meta))
+    if any(relation.on_delete not in (
+        models.CASCADE, models.SET_NULL, models.DO_NOTHING
+    ) for relation in relations):
+        return queryset.delete()[1].get(model._meta.label, 0)
+    pks = queryset.values('pk')
+    for relation in relations:
+        related = relation.related_model._base_manager.using(
+            queryset.db
+        ).filter(**{f'{relation.field.name}__in': pks})
+        if relation.on_delete is models.CASCADE:
+            bulk_delete(related)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_recipes(queryset, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Удаление рецептов пачками по chunk_size, каждая пачка в своей
+    транзакции. Картинки удаляются фоновыми задачами после фиксации.
+    progress(удалено_всего) вызывается после каждой пачки.
+    """
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list(
+            'pk', flat=True
+        )[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            recipes = Recipe.objects.filter(pk__in=ids)
+            images = [name for name in recipes.values_list(
+                'image', flat=True
+            ) if name]
+            planning.invalidate_recipes(ids)
+            deleted += bulk_delete(recipes)
+            # Журнал пишется последним: его блокировка держится до
+            # фиксации (см. recipes/changes.py).
+            changes.log(Change.RECIPE, ids, deleted=True)
+            if images:
+                enqueue_on_commit(tasks.delete_files, images)
+        if progress is not None:
+            progress(deleted)
+
+
+def delete_user(user, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Удаление пользователя: сначала пачками его рецепты, затем
+    одним проходом подписки, избранное, списки покупок и сам
+    пользователь.
+    """
+    delete_recipes(user.recipes.all(), chunk_size, progress)
+    with transaction.atomic():
+        Change.objects.bulk_create(
+            Change(kind=Change.SUBSCRIPTION, object_id=user.pk,
+                   user_id=follower_id, deleted=True)
+            for follower_id in Subscriptions.objects.filter(
+                author=user
+            ).values_list('user_id', flat=True).iterator()
+        )
+        return bulk_delete(type(user)._base_manager.filter(pk=user.pk))
@@ -0,0 +1,120 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.deletion import delete_user
+from recipes.models import (
+    AmountIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+def counter(queries):
+    """
+    Обёртка выполнения запросов, считающая их без ограничения
+    журнала запросов Django.
+    """
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+class Command(BaseCommand):
+    help = ('Сравнение Model.delete() и recipes.deletion.delete_user() на '
+            'авторе с большим количеством рецептов. Все тестовые данные '
+            'удаляются откатом транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+',
+                            default=[100, 1000, 10000])
+        parser.add_argument('--fans', type=int, default=5,
+                            help='Пользователи, добавившие все рецепты '
+                                 'в избранное и список покупок.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tags = [
+                Tag.objects.create(name=f'bench_{i}', color=f'#00000{i}',
+                                   slug=f'bench_{i}')
+                for i in range(3)
+            ]
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'bench_{i}', measurement_unit='г')
+                for i in range(5)
+            )
+            ingredients = list(Ingredient.objects.filter(
+                name__startswith='bench_'
+            ))
+            fans = [
+                User.objects.create(username=f'bench_fan_{i}',
+                                    email=f'bench_fan_{i}@example.com')
+                for i in range(options['fans'])
+            ]
+            for count in options['recipes']:
+                self.stdout.write(f'Рецептов: {count}')
+                for name, delete in (
+                    ('Model.delete()', lambda author: author.delete()),
+                    ('delete_user()', lambda author: delete_user(
+                        author, options['chunk_size']
+                    )),
+                ):
+                    sid = transaction.savepoint()
+                    author = self.create_author(count, tags, ingredients,
+                                                fans)
+                    queries = []
+                    with connection.execute_wrapper(counter(queries)):
+                        started = perf_counter()
+                        delete(author)
+                        elapsed = perf_counter() - started
+                    transaction.savepoint_rollback(sid)
+                    self.stdout.write(
+                        f'  {name:<15} {elapsed * 1000:>9.1f} мс, '
+                        f'запросов: {len(queries)}'
+                    )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_author(count, tags, ingredients, fans):
+        author = User.objects.create(username='bench_author',
+                                     email='bench_author@example.com')
+        for fan in fans:
+            Subscriptions.objects.create(user=fan, author=author)
+        # SQLite не возвращает первичные ключи из bulk_create.
+        Recipe.objects.bulk_create(
+            (Recipe(author=author, name=f'Рецепт {i}',
+                    image='recipes/images/bench.png', text='-',
+                    cooking_time=10) for i in range(count)),
+            batch_size=1000,
+        )
+        recipes = list(Recipe.objects.filter(
+            author=author
+        ).values_list('pk', flat=True))
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe_id=recipe, tag=tag)
+             for recipe in recipes for tag in tags),
+            batch_size=1000,
+        )
+        AmountIngredient.objects.bulk_create(
+            (AmountIngredient(recipe_id=recipe, ingredient=ingredient,
+                              amount=100)
+             for recipe in recipes for ingredient in ingredients),
+            batch_size=1000,
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                (model(user=fan, recipe_id=recipe)
+                 for recipe in recipes for fan in fans),
+                batch_size=1000,
+            )
+        return author
@@ -0,0 +1,104 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+from recipes.models import Recipe
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Замер скорости ленты подписок для пользователей с 10, 1000 '
+            'и 10000 подписок. Все тестовые данные удаляются откатом '
+            'транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--follows', type=int, nargs='+',
+                            default=[10, 1000, 10000])
+        parser.add_argument('--recipes-per-author', type=int, default=3)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            authors = self.create_authors(
+                max(options['follows']), options['recipes_per_author']
+            )
+            for follows in options['follows']:
+                reader = User.objects.create(
+                    username=f'bench_reader_{follows}',
+                    email=f'bench_reader_{follows}@example.com',
+                )
+                Subscriptions.objects.bulk_create(
+                    Subscriptions(user=reader, author=author)
+                    for author in authors[:follows]
+                )
+                feed.rebuild_inbox(reader)
+                self.stdout.write(f'Подписок: {follows}')
+                for name, run in (
+                    ('join', self.naive_pages),
+                    (feed.MERGE, self.strategy_pages(feed.MERGE)),
+                    (feed.INBOX, self.strategy_pages(feed.INBOX)),
+                ):
+                    elapsed = self.measure(run, reader, options)
+                    self.stdout.write(f'  {name:<6} {elapsed * 1000:.2f} мс')
+            transaction.set_rollback(True)
+
+    def create_authors(self, count, recipes_per_author):
+        User.objects.bulk_create(
+            User(username=f'bench_author_{i}',
+                 email=f'bench_author_{i}@example.com')
+            for i in range(count)
+        )
+        authors = list(User.objects.filter(
+            username__startswith='bench_author_'
+        ).order_by('id'))
+        Recipe.objects.bulk_create(
+            (Recipe(author=author, name=f'Рецепт {i}',
+                    image='recipes/images/bench.png', text='-',
+                    cooking_time=10)
+             for author in authors for i in range(recipes_per_author)),
+            batch_size=1000,
+        )
+        return authors
+
+    def measure(self, run, reader, options):
+        started = perf_counter()
+        for _ in range(options['repeat']):
+            run(reader, options['limit'], options['pages'])
+        return (perf_counter() - started) / options['repeat']
+
+    @staticmethod
+    def naive_pages(reader, limit, pages):
+        cursor = None
+        for _ in range(pages):
+            rows = list(Recipe.objects.filter(
+                feed.keyset_filter(cursor), author__following__user=reader
+            ).order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:limit])
+            if len(rows) < limit:
+                return
+            cursor = rows[-1]
+
+    @staticmethod
+    def strategy_pages(strategy):
+        def run(reader, limit, pages):
+            author_ids = list(Subscriptions.objects.filter(
+                user=reader
+            ).values_list('author_id', flat=True))
+            cursor = None
+            for _ in range(pages):
+                if strategy == feed.INBOX:
+                    rows = feed.inbox_page(reader, cursor, limit)
+                else:
+                    rows = feed.merge_page(author_ids, cursor, limit)
+                if len(rows) < limit:
+                    return
+                cursor = rows[-1]
+        return run
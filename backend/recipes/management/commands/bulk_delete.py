@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.deletion import CHUNK_SIZE, delete_recipes, delete_user
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Удаление пользователей и рецептов пачками без загрузки '
+            'связанных объектов в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', default=[],
+                            help='Удалить пользователей с рецептами.')
+        parser.add_argument('--authors', type=int, nargs='+', default=[],
+                            help='Удалить все рецепты авторов.')
+        parser.add_argument('--recipes', type=int, nargs='+', default=[])
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not (options['users'] or options['authors']
+                or options['recipes']):
+            raise CommandError('Укажите --users, --authors или --recipes.')
+        chunk_size = options['chunk_size']
+        if options['recipes']:
+            self.stdout.write('Рецепты:')
+            delete_recipes(Recipe.objects.filter(pk__in=options['recipes']),
+                           chunk_size, self.progress)
+        for author_id in options['authors']:
+            self.stdout.write(f'Рецепты автора {author_id}:')
+            delete_recipes(Recipe.objects.filter(author_id=author_id),
+                           chunk_size, self.progress)
+        for user in User.objects.filter(pk__in=options['users']):
+            self.stdout.write(f'Пользователь {user.pk} ({user.username}):')
+            delete_user(user, chunk_size, self.progress)
+            self.stdout.write('  пользователь удалён')
+
+    def progress(self, deleted):
+        self.stdout.write(f'  удалено рецептов: {deleted}')
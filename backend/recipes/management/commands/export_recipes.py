@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.transfer import CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов в NDJSON (рецепт на строку).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-',
+                            help='Файл для выгрузки, по умолчанию stdout.')
+        parser.add_argument('--author', action='append', default=[],
+                            help='Выгрузить рецепты только этих авторов '
+                                 '(username).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['author']:
+            recipes = recipes.filter(author__username__in=options['author'])
+        if options['output'] == '-':
+            self.write(sys.stdout.buffer, recipes, options['chunk_size'])
+            return
+        with open(options['output'], 'wb') as output:
+            count = self.write(output, recipes, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count}'
+        ))
+
+    @staticmethod
+    def write(output, recipes, chunk_size):
+        count = 0
+        for line in export_lines(recipes, chunk_size):
+            output.write(line)
+            count += 1
+        return count
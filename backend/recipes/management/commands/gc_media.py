@@ -0,0 +1,124 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import RECIPE_IMAGES_DIR, Recipe, StoredImage
+
+
+def scan_files(root):
+    """
+    Обход каталога через os.scandir без построения полного списка
+    файлов. Возвращает (путь относительно MEDIA_ROOT, stat) для файлов.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield (
+                        os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                        .replace(os.sep, '/'),
+                        entry.stat(follow_symlinks=False),
+                    )
+
+
+def unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Удаление файлов картинок рецептов, на которые не ссылается '
+            'ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Не трогать файлы моложе N секунд: они '
+                                 'могут принадлежать незавершённой '
+                                 'загрузке.')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--verbose-files', action='store_true')
+
+    def handle(self, *args, **options):
+        # Время отсечки фиксируется до чтения ссылок из базы: файл,
+        # загруженный позже, не будет удалён, даже если рецепт ещё
+        # не сохранён.
+        cutoff = time.time() - options['min_age']
+        referenced = set(Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).iterator(chunk_size=options['chunk_size']))
+        self.stdout.write(f'Файлов в базе: {len(referenced)}')
+
+        names, size = [], 0
+        scanned = 0
+        for name, stat in scan_files(
+            os.path.join(settings.MEDIA_ROOT, RECIPE_IMAGES_DIR)
+        ):
+            scanned += 1
+            if name in referenced or stat.st_mtime > cutoff:
+                continue
+            names.append(name)
+            size += stat.st_size
+            if options['verbose_files']:
+                self.stdout.write(f'  {name}')
+
+        self.stdout.write(
+            f'Просмотрено файлов: {scanned}, без ссылок: {len(names)} '
+            f'({size / 1024 / 1024:.1f} МБ)'
+        )
+        if options['dry_run'] or not names:
+            return
+        deleted = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for start in range(0, len(names), options['chunk_size']):
+                deleted += self.collect(
+                    names[start:start + options['chunk_size']], pool
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {deleted}'
+        ))
+
+    def collect(self, names, pool):
+        """
+        Удаление файлов names, на которые по-прежнему нет ссылок.
+
+        Между чтением ссылок из базы и удалением файл мог быть
+        переиспользован загрузкой того же содержимого. Поэтому строки
+        счётчика блокируются (недостающие создаются с нулём, чтобы
+        загрузка ждала их блокировки), и удаляются только файлы с
+        нулевым счётчиком. Загрузка, дождавшаяся блокировки, не найдёт
+        файла и запишет его заново.
+        """
+        StoredImage.objects.bulk_create(
+            (StoredImage(name=name, refcount=0) for name in names),
+            ignore_conflicts=True,
+        )
+        with transaction.atomic():
+            unused = [
+                name for name, refcount in StoredImage.objects
+                .select_for_update().filter(name__in=names)
+                .values_list('name', 'refcount')
+                if not refcount
+            ]
+            for _ in pool.map(unlink, (
+                os.path.join(settings.MEDIA_ROOT, name) for name in unused
+            ), chunksize=256):
+                pass
+            StoredImage.objects.filter(name__in=unused).delete()
+        return len(unused)
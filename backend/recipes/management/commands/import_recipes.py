@@ -0,0 +1,44 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import CHUNK_SIZE, Importer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Загрузка рецептов из NDJSON, выгруженного export_recipes. '
+            'Файлы картинок должны быть скопированы в MEDIA_ROOT заранее.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON или - для stdin.')
+        parser.add_argument('--batch-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--default-author',
+                            help='Назначить автором всех рецептов '
+                                 'пользователя с этим username.')
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['default_author']:
+            default_author = User.objects.filter(
+                username=options['default_author']
+            ).first()
+            if default_author is None:
+                raise CommandError('Пользователь не найден.')
+        importer = Importer(options['batch_size'], default_author)
+        if options['path'] == '-':
+            importer.run(sys.stdin.buffer, self.progress)
+        else:
+            with open(options['path'], 'rb') as lines:
+                importer.run(lines, self.progress)
+        for error in importer.errors:
+            self.stderr.write(f'  строка {error["line"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {importer.created}, '
+            f'строк с ошибками: {importer.error_count}'
+        ))
+
+    def progress(self, created):
+        self.stdout.write(f'  загружено: {created}')
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.changes import prune
+
+
+class Command(BaseCommand):
+    help = ('Удаление старых записей журнала изменений. Клиенты с более '
+            'старым курсором получат 410 и загрузят данные заново.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.CHANGES_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune(timedelta(days=options['days']))
+        self.stdout.write(f'Удалено записей: {deleted}')
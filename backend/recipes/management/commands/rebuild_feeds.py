@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.feed import get_inbox_threshold, rebuild_inbox
+from recipes.models import FeedInbox
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Перестройка материализованных лент подписок, например после '
+            'изменения FEED_INBOX_THRESHOLD или массового создания '
+            'подписок в обход API.')
+
+    def handle(self, *args, **options):
+        heavy = list(Subscriptions.objects.values('user').annotate(
+            total=Count('id')
+        ).filter(
+            total__gte=get_inbox_threshold()
+        ).values_list('user', flat=True))
+        removed = FeedInbox.objects.exclude(user__in=heavy).delete()[0]
+        self.stdout.write(f'Удалено строк лент ниже порога: {removed}')
+        for number, user in enumerate(
+            User.objects.filter(pk__in=heavy).only('id').iterator(), 1
+        ):
+            with transaction.atomic():
+                rebuild_inbox(user)
+            self.stdout.write(f'  перестроено лент: {number}/{len(heavy)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перестроено лент: {len(heavy)}'
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+# Таблица единиц на момент миграции (recipes.units.UNITS может
+# измениться): единица → (базовая единица, множитель).
+UNITS = {
+    'мг': ('г', 0.001),
+    'г': ('г', 1),
+    'гр': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+}
+
+
+def fill_units(apps, schema_editor):
+    # Как recipes.units.normalize: пробелы по краям отбрасываются,
+    # регистр не учитывается.
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'measurement_unit'))
+    for ingredient in ingredients:
+        unit = ingredient.measurement_unit.strip()
+        ingredient.base_unit, ingredient.unit_factor = UNITS.get(
+            unit.lower(), (unit, 1)
+        )
+    Ingredient.objects.bulk_update(
+        ingredients, ('base_unit', 'unit_factor'), batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_stored_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='base_unit',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Базовая единица измерения'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='unit_factor',
+            field=models.FloatField(default=1, editable=False, verbose_name='Множитель для базовой единицы'),
+        ),
+        migrations.RunPython(fill_units, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:08
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_ingredient_base_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('servings', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1, message='Минимальное значение 1!'), django.core.validators.MaxValueValidator(100, message='Максимальное значение 100!')], verbose_name='Порции')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_plans', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_plans', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рецепт в плане питания',
+                'verbose_name_plural': 'План питания',
+                'ordering': ('date', 'id'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mealplan',
+            constraint=models.UniqueConstraint(fields=('user', 'date', 'recipe'), name='unique_meal_plan'),
+        ),
+    ]
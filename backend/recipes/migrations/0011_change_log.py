@@ -0,0 +1,31 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'Рецепт'), ('tag', 'Тег'), ('ingredient', 'Ингредиент'), ('favorite', 'Избранное'), ('shopping_cart', 'Список покупок'), ('subscription', 'Подписка')], max_length=20, verbose_name='Тип объекта')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалён')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время изменения')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+# recipes.tagmask.MAX_BITS на момент миграции.
+MAX_BITS = 63
+
+
+def fill_tag_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for bit, tag in zip(range(MAX_BITS), Tag.objects.order_by('id')):
+        tag.bit = bit
+        tag.save(update_fields=('bit',))
+        Recipe.objects.filter(tags=tag).update(
+            tag_mask=F('tag_mask').bitor(1 << bit)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит в маске тегов рецепта'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
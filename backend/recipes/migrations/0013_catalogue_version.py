@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    apps.get_model('recipes', 'CatalogueVersion').objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_tag_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия справочников',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
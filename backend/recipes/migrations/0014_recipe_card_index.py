@@ -0,0 +1,21 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_catalogue_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_author_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], include=('name', 'image', 'cooking_time'), name='recipe_author_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# recipes.tagmask.INDEXED_BITS на момент миграции.
+INDEXED_BITS = 16
+
+
+def index_name(bit):
+    return f'recipe_tag_bit_{bit}_idx'
+
+
+class Migration(migrations.Migration):
+    """
+    Частичные индексы по pub_date для рецептов с битом тега (см.
+    recipes/tagmask.py). Условие индекса должно совпадать с условием
+    фильтра, поэтому индексы создаются SQL-запросами: Index.condition
+    не выражает побитовое И.
+    """
+
+    dependencies = [
+        ('recipes', '0015_recipe_pub_date_default'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {index_name(bit)} ON recipes_recipe '
+                f'(pub_date) WHERE (tag_mask & {1 << bit}) > 0',
+            reverse_sql=f'DROP INDEX {index_name(bit)}',
+        )
+        for bit in range(INDEXED_BITS)
+    ]
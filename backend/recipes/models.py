@@ -1,11 +1,27 @@
+import os
+
 from django.core.validators import (
     MaxValueValidator,
     MinValueValidator,
     RegexValidator,
 )
 from django.db import models
+from django.utils import timezone
 
 from users.models import User
+from .storage import recipe_image_storage
+
+RECIPE_IMAGES_DIR = 'recipes/images'
+
+
+def recipe_image_path(instance, filename):
+    """
+    Путь для загруженной картинки. Имя файла заменяется хешем
+    содержимого в recipe_image_storage, отсюда берутся каталог
+    и расширение.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    return f'{RECIPE_IMAGES_DIR}/image{ext}'
 
 
 class Tag(models.Model):
@@ -23,6 +39,12 @@ class Tag(models.Model):
         ],
     )
     slug = models.SlugField(unique=True, verbose_name='Уникальный слаг')
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name='Бит в маске тегов рецепта',
+    )
 
     class Meta:
         verbose_name = 'Тэг'
@@ -37,6 +59,17 @@ class Ingredient(models.Model):
                             verbose_name='Название')
     measurement_unit = models.CharField(max_length=200,
                                         verbose_name='Единица измерения')
+    base_unit = models.CharField(
+        max_length=200,
+        default='',
+        editable=False,
+        verbose_name='Базовая единица измерения',
+    )
+    unit_factor = models.FloatField(
+        default=1,
+        editable=False,
+        verbose_name='Множитель для базовой единицы',
+    )
 
     class Meta:
         ordering = ('name',)
@@ -85,13 +118,20 @@ class Recipe(models.Model):
         max_length=200,
         verbose_name='Название блюда',
     )
+    # Не auto_now_add: импорт передаёт дату публикации при вставке.
     pub_date = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         db_index=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     image = models.ImageField(
-        upload_to='recipes/images/',
+        upload_to=recipe_image_path,
+        storage=recipe_image_storage,
         verbose_name='Картинка',
     )
     text = models.TextField(
@@ -108,6 +148,11 @@ class Recipe(models.Model):
         verbose_name='Теги',
         related_name='recipes',
     )
+    tag_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов',
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления в минутах',
         validators=[
@@ -120,6 +165,39 @@ class Recipe(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            # Покрывающий индекс карточек рецептов автора: в PostgreSQL
+            # страница карточек читается из индекса без обращения
+            # к строкам таблицы (и к длинному text).
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                include=('name', 'image', 'cooking_time'),
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+# Поля карточки рецепта (избранное, список покупок, рецепты в подписках,
+# план питания, популярное). Их покрывает recipe_author_pub_date_idx.
+RECIPE_CARD_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+class StoredImage(models.Model):
+    """
+    Количество рецептов, ссылающихся на файл картинки
+    (см. recipes/storage.py).
+    """
+    name = models.CharField(unique=True, max_length=100,
+                            verbose_name='Файл')
+    refcount = models.PositiveIntegerField(default=0,
+                                           verbose_name='Количество ссылок')
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
 
     def __str__(self):
         return self.name
@@ -138,6 +216,10 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name_plural = 'Избранные рецепты'
@@ -162,6 +244,10 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name_plural = 'Рецепты для списка покупок'
@@ -171,3 +257,154 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+
+
+class MealPlan(models.Model):
+    """
+    Рецепт в плане питания пользователя на дату. servings — во сколько
+    раз увеличить количество ингредиентов рецепта.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='meal_plans',
+        verbose_name='Пользователь'
+    )
+    date = models.DateField(verbose_name='Дата')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='meal_plans',
+        verbose_name='Рецепт'
+    )
+    servings = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name='Порции',
+        validators=[
+            MinValueValidator(1, message='Минимальное значение 1!'),
+            MaxValueValidator(100, message='Максимальное значение 100!'),
+        ],
+    )
+
+    class Meta:
+        ordering = ('date', 'id')
+        verbose_name = 'Рецепт в плане питания'
+        verbose_name_plural = 'План питания'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'date', 'recipe'),
+                name='unique_meal_plan'
+            )
+        ]
+
+
+class FeedInbox(models.Model):
+    """
+    Материализованная лента подписок: строка на каждый рецепт автора,
+    на которого подписан пользователь. Заполняется только для пользователей
+    с большим количеством подписок.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_inbox',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_inbox'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_inbox_user_pub_date_idx',
+            ),
+        ]
+
+
+class Change(models.Model):
+    """
+    Запись журнала изменений для синхронизации клиентов
+    (см. recipes/changes.py). user заполнен для личных данных:
+    избранного, списка покупок и подписок.
+    """
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (TAG, 'Тег'),
+        (INGREDIENT, 'Ингредиент'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KINDS,
+        verbose_name='Тип объекта'
+    )
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    deleted = models.BooleanField(default=False, verbose_name='Удалён')
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self):
+        action = 'удалён' if self.deleted else 'изменён'
+        return f'{self.get_kind_display()} {self.object_id} {action}'
+
+
+class CatalogueVersion(models.Model):
+    """
+    Версия справочников тегов и ингредиентов: единственная строка,
+    счётчик увеличивается при каждом их изменении
+    (см. recipes/catalogue.py).
+    """
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочников'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return str(self.version)
@@ -0,0 +1,93 @@
+"""
+Списки покупок по плану питания.
+
+Количество каждого ингредиента умножается на число порций и
+суммируется в базовых единицах одним запросом. Результат за неделю
+кэшируется по ключу (пользователь, понедельник недели); при изменении
+записей плана или ингредиентов запланированных рецептов сбрасываются
+только затронутые недели.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+
+from foodgram.metrics import count_cache
+
+from .models import AmountIngredient, MealPlan
+from .units import amount_in_base_units, format_amount
+
+WEEK_KEY = 'meal_plan_week:{}:{}'
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def aggregate(user_id, start, end):
+    """
+    Список покупок за даты с start по end включительно.
+    """
+    ingredients = AmountIngredient.objects.filter(
+        recipe__meal_plans__user_id=user_id,
+        recipe__meal_plans__date__range=(start, end),
+    ).values_list(
+        'ingredient__name',
+        'ingredient__base_unit',
+    ).order_by(
+        'ingredient__name'
+    ).annotate(
+        total=Sum(
+            amount_in_base_units * F('recipe__meal_plans__servings'),
+            output_field=FloatField(),
+        )
+    )
+    return [
+        {
+            'name': name,
+            'measurement_unit': unit,
+            'amount': total,
+            'display': format_amount(total, unit),
+        }
+        for name, unit, total in ingredients
+    ]
+
+
+def week_shopping_list(user_id, day):
+    """
+    Список покупок за неделю, в которую входит day, из кэша.
+    """
+    start = week_start(day)
+    key = WEEK_KEY.format(user_id, start.isoformat())
+    result = cache.get(key)
+    count_cache('meal_plan', result is not None)
+    if result is None:
+        result = aggregate(user_id, start, start + timedelta(days=6))
+        cache.set(key, result, getattr(settings, 'MEAL_PLAN_CACHE_SECONDS',
+                                       7 * 86400))
+    return result
+
+
+def invalidate(entries):
+    """
+    Сброс кэша недель для пар (user_id, date) после фиксации транзакции:
+    чтение до неё посчитало бы список по старым данным и вернуло бы их
+    в кэш. Ключи вычисляются сразу, пока записи плана ещё в базе.
+    """
+    keys = {
+        WEEK_KEY.format(user_id, week_start(day).isoformat())
+        for user_id, day in entries
+    }
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_recipes(recipes):
+    """
+    Сброс недель, в которые запланированы рецепты (id или queryset).
+    """
+    invalidate(MealPlan.objects.filter(recipe__in=recipes).values_list(
+        'user_id', 'date'
+    ).distinct().iterator())
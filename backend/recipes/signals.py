@@ -0,0 +1,311 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from foodgram import pubsub
+from tasks.registry import enqueue_on_commit
+from users.models import Subscriptions
+
+from . import catalogue, changes, planning, tagmask, tasks, units
+from .models import (
+    Change,
+    Favorite,
+    Ingredient,
+    MealPlan,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+
+# Общие объекты журнала изменений.
+CHANGE_KINDS = {
+    Recipe: Change.RECIPE,
+    Tag: Change.TAG,
+    Ingredient: Change.INGREDIENT,
+}
+
+# Личные объекты журнала: тип и поле с id объекта.
+PRIVATE_CHANGE_KINDS = {
+    Favorite: (Change.FAVORITE, 'recipe_id'),
+    ShoppingCart: (Change.SHOPPING_CART, 'recipe_id'),
+    Subscriptions: (Change.SUBSCRIPTION, 'author_id'),
+}
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw, **kwargs):
+    """
+    Добавление нового рецепта в материализованные ленты подписчиков.
+    Рецепты из фикстур и импорта (raw) рассылаются загрузчиком.
+    """
+    if created and not raw:
+        enqueue_on_commit(
+            tasks.fan_out_recipe, instance.id,
+            idempotency_key=f'fan_out_recipe:{instance.id}',
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image(sender, instance, **kwargs):
+    """
+    Удаление картинки удалённого рецепта.
+    """
+    if instance.image:
+        enqueue_on_commit(tasks.delete_file, instance.image.name)
+
+
+@receiver(post_save, sender=Subscriptions)
+def subscription_created(sender, instance, created, **kwargs):
+    """
+    Дозаполнение ленты подписчика рецептами нового автора.
+    """
+    if created:
+        enqueue_on_commit(
+            tasks.update_subscription_feed,
+            instance.user_id, instance.author_id,
+        )
+
+
+@receiver(post_delete, sender=Subscriptions)
+def subscription_deleted(sender, instance, **kwargs):
+    """
+    Удаление рецептов автора из ленты бывшего подписчика.
+    """
+    enqueue_on_commit(
+        tasks.update_subscription_feed,
+        instance.user_id, instance.author_id,
+    )
+
+
+def touch_recipes(recipes):
+    """
+    Обновление даты изменения рецептов (валидаторы условного GET)
+    и запись их изменения в журнал.
+    """
+    recipes.update(updated_at=timezone.now())
+    changes.log(Change.RECIPE, recipes.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        touch_recipes(Recipe.objects.filter(tags=instance))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            touch_recipes(Recipe.objects.filter(pk=instance.pk))
+        elif pk_set:
+            touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+def ingredients_changed(recipe_ids):
+    """
+    Изменение ингредиентов рецептов в обход сохранения рецепта (админка
+    AmountIngredient). Вызывается явно один раз на операцию: ингредиенты
+    записываются через bulk_create без сигналов, а обработчики каждой
+    строки стоили бы запросов на каждый ингредиент.
+    """
+    touch_recipes(Recipe.objects.filter(pk__in=recipe_ids))
+    planning.invalidate_recipes(recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tag_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Обновление маски тегов рецептов (recipes/tagmask.py). У рецепта в
+    памяти маска меняется вместе с базой: его ещё могут сохранить.
+    """
+    if reverse:
+        mask = tagmask.mask_of([instance.bit])
+        if action == 'pre_clear':
+            tagmask.remove_bits(Recipe.objects.filter(tags=instance), mask)
+        elif action == 'post_add' and pk_set:
+            tagmask.add_bits(Recipe.objects.filter(pk__in=pk_set), mask)
+        elif action == 'post_remove' and pk_set:
+            tagmask.remove_bits(Recipe.objects.filter(pk__in=pk_set), mask)
+        return
+    recipes = Recipe.objects.filter(pk=instance.pk)
+    if action == 'post_clear':
+        recipes.update(tag_mask=0)
+        instance.tag_mask = 0
+    elif action == 'post_add' and pk_set:
+        mask = tagmask.tags_mask(pk_set)
+        tagmask.add_bits(recipes, mask)
+        instance.tag_mask |= mask
+    elif action == 'post_remove' and pk_set:
+        mask = tagmask.tags_mask(pk_set)
+        tagmask.remove_bits(recipes, mask)
+        instance.tag_mask &= ~mask
+
+
+@receiver(pre_save, sender=Tag)
+def tag_bit(sender, instance, **kwargs):
+    """
+    Бит тега в маске рецептов (в том числе при загрузке фикстур).
+    """
+    if instance.bit is None:
+        instance.bit = tagmask.free_bit()
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """
+    Освобождение бита: связи удаляются каскадом без m2m_changed.
+    """
+    mask = tagmask.mask_of([instance.bit])
+    tagmask.remove_bits(tagmask.with_any(Recipe.objects.all(), mask), mask)
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(pre_save, sender=Ingredient)
+def ingredient_units(sender, instance, **kwargs):
+    """
+    Базовая единица и множитель для списка покупок (в том числе при
+    загрузке фикстур).
+    """
+    instance.base_unit, instance.unit_factor = units.normalize(
+        instance.measurement_unit
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(ingredients=instance))
+        planning.invalidate_recipes(
+            Recipe.objects.filter(ingredients=instance).values('pk')
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def catalogue_changed(sender, **kwargs):
+    """
+    Новая версия справочников (в том числе при загрузке фикстур):
+    процессы перечитают их при следующей сверке версии.
+    """
+    catalogue.bump()
+
+
+@receiver(pre_save, sender=MealPlan)
+def meal_plan_moved(sender, instance, raw, **kwargs):
+    """
+    Сброс списка покупок недели, из которой переносится запись плана.
+    """
+    if instance.pk is not None and not raw:
+        planning.invalidate(MealPlan.objects.filter(
+            pk=instance.pk
+        ).values_list('user_id', 'date'))
+
+
+@receiver(post_save, sender=MealPlan)
+@receiver(post_delete, sender=MealPlan)
+def meal_plan_changed(sender, instance, **kwargs):
+    planning.invalidate([(instance.user_id, instance.date)])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def log_change(sender, instance, raw, **kwargs):
+    """
+    Запись изменения в журнал синхронизации. Рецепты из импорта (raw)
+    записываются загрузчиком.
+    """
+    if not raw:
+        changes.log(CHANGE_KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def log_deletion(sender, instance, **kwargs):
+    changes.log(CHANGE_KINDS[sender], [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscriptions)
+def log_private_change(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        kind, field = PRIVATE_CHANGE_KINDS[sender]
+        changes.log(kind, [getattr(instance, field)], instance.user_id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscriptions)
+def log_private_deletion(sender, instance, **kwargs):
+    kind, field = PRIVATE_CHANGE_KINDS[sender]
+    changes.log(
+        kind, [getattr(instance, field)], instance.user_id, deleted=True
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def announce_recipe(sender, instance, created, raw, **kwargs):
+    """
+    Живое обновление для подписчиков автора (api/sse.py).
+    """
+    if created and not raw:
+        pubsub.publish({
+            'type': 'recipe',
+            'id': instance.id,
+            'author': instance.author_id,
+            'name': instance.name,
+        })
+
+
+def recipe_counts(recipe_id):
+    return {
+        'type': 'counts',
+        'recipe': recipe_id,
+        'favorites': Favorite.objects.filter(recipe_id=recipe_id).count(),
+        'shopping_carts': ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).count(),
+    }
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def announce_counts(sender, instance, raw=False, created=True, **kwargs):
+    """
+    Счётчики рецепта считаются после фиксации транзакции.
+    """
+    if created and not raw:
+        recipe_id = instance.recipe_id
+        pubsub.publish(lambda: recipe_counts(recipe_id))
+
+
+def subscription_event(instance, active):
+    return {
+        'type': 'subscription',
+        'user': instance.user_id,
+        'author': instance.author_id,
+        'active': active,
+    }
+
+
+@receiver(post_save, sender=Subscriptions)
+def announce_subscription(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        pubsub.publish(subscription_event(instance, True))
+
+
+@receiver(post_delete, sender=Subscriptions)
+def announce_unsubscription(sender, instance, **kwargs):
+    pubsub.publish(subscription_event(instance, False))
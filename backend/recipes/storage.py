@@ -0,0 +1,121 @@
+"""
+Хранилище картинок с адресацией по содержимому.
+
+Имя файла — BLAKE2-хеш его содержимого, поэтому одинаковые картинки
+хранятся один раз, а URL файла никогда не меняет содержимое и может
+кэшироваться навсегда:
+
+    recipes/images/ab/cd/abcd0123....png
+
+Количество ссылок на файл хранится в StoredImage: каждое сохранение
+увеличивает счётчик, каждое delete() уменьшает; файл удаляется с диска,
+когда ссылок не осталось. Для файлов, сохранённых до появления
+хранилища (строки счётчика нет), delete() удаляет файл сразу.
+"""
+import os
+import posixpath
+from collections import Counter, defaultdict
+from hashlib import blake2b
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from foodgram.metrics import IMAGE_SECONDS
+
+DIGEST_SIZE = 16
+
+
+def content_hash(content):
+    """
+    Хеш содержимого файла, читаемого по частям.
+    """
+    digest = blake2b(digest_size=DIGEST_SIZE)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        digest = content_hash(content)
+        directory, filename = posixpath.split(name)
+        ext = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], f'{digest}{ext}'
+        )
+
+    def _save(self, name, content):
+        with IMAGE_SECONDS.time(operation='store'):
+            return self.save_deduplicated(name, content)
+
+    def save_deduplicated(self, name, content):
+        # Модели приложения импортируют это хранилище.
+        from .models import StoredImage
+
+        name = self.hashed_name(name, content)
+        # Счётчик увеличивается до проверки файла: строка остаётся
+        # заблокированной до конца транзакции, и параллельный delete()
+        # не удалит файл, который сейчас переиспользуется.
+        with transaction.atomic():
+            if not StoredImage.objects.filter(name=name).update(
+                refcount=F('refcount') + 1
+            ):
+                try:
+                    with transaction.atomic():
+                        StoredImage.objects.create(name=name, refcount=1)
+                except IntegrityError:
+                    StoredImage.objects.filter(name=name).update(
+                        refcount=F('refcount') + 1
+                    )
+            if self.exists(name):
+                # Время изменения переиспользованного файла обновляется,
+                # чтобы его защищал порог --min-age в gc_media.
+                os.utime(self.path(name))
+                return name
+            saved = super()._save(name, content)
+        if saved != name:
+            # Такой же файл записан параллельным запросом.
+            super().delete(saved)
+        return name
+
+    def delete(self, name):
+        from .models import StoredImage
+
+        with transaction.atomic():
+            stored = StoredImage.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is not None and stored.refcount > 1:
+                stored.refcount = F('refcount') - 1
+                stored.save(update_fields=('refcount',))
+                return
+            if stored is not None:
+                stored.delete()
+            super().delete(name)
+
+
+def add_references(names):
+    """
+    Учёт ссылок на уже существующие файлы (например, у рецептов,
+    загруженных импортом в обход сохранения файла).
+    """
+    from .models import StoredImage
+
+    by_increment = defaultdict(list)
+    for name, count in Counter(names).items():
+        by_increment[count].append(name)
+    StoredImage.objects.bulk_create(
+        (StoredImage(name=name, refcount=0) for name in set(names)),
+        ignore_conflicts=True,
+    )
+    for count, batch in by_increment.items():
+        StoredImage.objects.filter(name__in=batch).update(
+            refcount=F('refcount') + count
+        )
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -0,0 +1,106 @@
+"""
+Битовая маска тегов рецепта.
+
+Тегов немного (завтрак, обед, ужин...), поэтому каждый тег получает
+свой бит (Tag.bit), а Recipe.tag_mask хранит OR битов тегов рецепта.
+Фильтр «хотя бы один из тегов» — условие в строке рецепта, без
+соединения с таблицей связей и без дублей строк:
+
+    (tag_mask & 1) > 0 OR (tag_mask & 4) > 0 ...
+
+Для первых INDEXED_BITS битов есть частичные индексы по pub_date с
+точно таким же условием (миграция 0016_tag_bit_indexes). По одному
+тегу PostgreSQL читает страницу из индекса бита в порядке pub_date и
+считает COUNT по нему же, даже если тег редкий; по нескольким —
+объединяет индексы (BitmapOr) или, для частых тегов, идёт по индексу
+pub_date с фильтром. Маска обновляется из сигнала m2m_changed
+(recipes/signals.py).
+
+Тегам сверх MAX_BITS бит не достаётся, для них фильтр проверяет
+таблицу связей подзапросом EXISTS.
+"""
+from django.db.models import Exists, F, OuterRef, Q
+
+from .models import Recipe, Tag
+
+MAX_BITS = 63
+# Биты с частичным индексом (миграция 0016_tag_bit_indexes).
+INDEXED_BITS = 16
+
+
+def mask_of(bits):
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def tags_mask(tag_ids):
+    """
+    Маска для тегов с id из tag_ids.
+    """
+    return mask_of(Tag.objects.filter(
+        pk__in=tag_ids
+    ).values_list('bit', flat=True))
+
+
+def free_bit():
+    """
+    Наименьший свободный бит или None, если все MAX_BITS заняты.
+    """
+    used = set(Tag.objects.exclude(bit=None).values_list('bit', flat=True))
+    return next((bit for bit in range(MAX_BITS) if bit not in used), None)
+
+
+def add_bits(recipes, mask):
+    if mask:
+        recipes.update(tag_mask=F('tag_mask').bitor(mask))
+
+
+def remove_bits(recipes, mask):
+    if mask:
+        recipes.update(tag_mask=F('tag_mask').bitand(~mask))
+
+
+def any_bit(queryset, mask):
+    """
+    queryset с псевдонимами битов mask и условие «есть хотя бы один из
+    них». Каждый бит проверяется отдельно и так же, как в условии его
+    частичного индекса; бит 63 не используется, поэтому «> 0».
+    """
+    bits = [bit for bit in range(MAX_BITS) if mask >> bit & 1]
+    queryset = queryset.alias(**{
+        f'tag_bit_{bit}': F('tag_mask').bitand(1 << bit) for bit in bits
+    })
+    condition = Q()
+    for bit in bits:
+        condition |= Q(**{f'tag_bit_{bit}__gt': 0})
+    return queryset, condition
+
+
+def with_any(queryset, mask):
+    """
+    Рецепты queryset, у которых есть хотя бы один бит из mask.
+    """
+    if not mask:
+        return queryset.none()
+    queryset, condition = any_bit(queryset, mask)
+    return queryset.filter(condition)
+
+
+def filter_any(queryset, tags):
+    """
+    Рецепты queryset хотя бы с одним из тегов tags.
+    """
+    mask = mask_of(tag.bit for tag in tags)
+    unmasked = [tag.pk for tag in tags if tag.bit is None]
+    if not unmasked:
+        return with_any(queryset, mask)
+    condition = Q(Exists(Recipe.tags.through.objects.filter(
+        recipe=OuterRef('pk'), tag__in=unmasked
+    )))
+    if mask:
+        queryset, bits_condition = any_bit(queryset, mask)
+        condition |= bits_condition
+    return queryset.filter(condition)
@@ -0,0 +1,59 @@
+from django.db import transaction
+
+from tasks.registry import task
+from users.models import Subscriptions, User
+
+from . import feed
+from .models import Recipe
+from .storage import recipe_image_storage
+
+
+@task
+def fan_out_recipe(recipe_id):
+    """
+    Добавление нового рецепта в материализованные ленты подписчиков.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is not None:
+        feed.fan_out(recipe)
+
+
+@task
+def update_subscription_feed(user_id, author_id, subscribed=None):
+    """
+    Обновление ленты подписчика после подписки или отписки.
+
+    Задачи выполняются параллельно и при повторах в любом порядке,
+    поэтому флаг на момент постановки не используется (subscribed
+    остался для задач, поставленных до обновления): под блокировкой
+    строки пользователя берётся текущее состояние подписки. Последняя
+    из задач пары всегда видит итоговое состояние.
+    """
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            pk=user_id
+        ).values_list('pk', flat=True))
+        if Subscriptions.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).exists():
+            feed.on_subscribe(user_id, author_id)
+        else:
+            feed.on_unsubscribe(user_id, author_id)
+
+
+@task
+def delete_file(name):
+    """
+    Удаление ссылки на картинку удалённого или изменённого рецепта;
+    файл удаляется, когда на него не осталось ссылок.
+    """
+    recipe_image_storage.delete(name)
+
+
+@task
+def delete_files(names):
+    """
+    Удаление ссылок на картинки рецептов, удалённых пачкой.
+    """
+    for name in names:
+        recipe_image_storage.delete(name)
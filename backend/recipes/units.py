@@ -0,0 +1,64 @@
+"""
+Приведение единиц измерения ингредиентов к базовым.
+
+Для каждого ингредиента заранее вычисляются базовая единица и
+множитель (Ingredient.base_unit и unit_factor), поэтому список покупок
+суммируется в базовых единицах одним запросом:
+
+    SUM(amount * unit_factor) GROUP BY name, base_unit
+
+и «мука, кг» складывается с «мука, г». Для вывода сумма переводится
+в удобную единицу (1500 г → 1.5 кг). Единицы, которых нет в UNITS
+(«шт.», «ст. л.», «щепотка»), остаются как есть с множителем 1.
+"""
+from django.db.models import ExpressionWrapper, F, FloatField
+
+# Единица: (базовая единица, множитель).
+UNITS = {
+    'мг': ('г', 0.001),
+    'г': ('г', 1),
+    'гр': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+}
+
+# Крупные единицы для вывода: (единица, сколько в ней базовых).
+DISPLAY_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+
+# Единицы без количества.
+UNCOUNTED_UNITS = {'по вкусу'}
+
+# Количество ингредиента рецепта (AmountIngredient) в базовых единицах.
+amount_in_base_units = ExpressionWrapper(
+    F('amount') * F('ingredient__unit_factor'), output_field=FloatField()
+)
+
+
+def normalize(unit):
+    """
+    Базовая единица и множитель для единицы измерения.
+    """
+    unit = unit.strip()
+    return UNITS.get(unit.lower(), (unit, 1))
+
+
+def format_amount(amount, base_unit):
+    """
+    Количество в удобной для чтения единице: 1500 г → «1.5 кг»,
+    0.5 шт. → «0.5 шт.», «по вкусу» — без количества.
+    """
+    if base_unit in UNCOUNTED_UNITS:
+        return base_unit
+    unit = base_unit
+    if base_unit in DISPLAY_UNITS:
+        display_unit, size = DISPLAY_UNITS[base_unit]
+        if amount >= size:
+            amount, unit = amount / size, display_unit
+    amount = round(amount, 2)
+    if amount == int(amount):
+        amount = int(amount)
+    return f'{amount} {unit}'
@@ -0,0 +1,55 @@
+from django.contrib import admin
+
+from .models import (
+    AuthorStatsDaily,
+    RecipeStatsDaily,
+    RecipeStatsHourly,
+    Watermark,
+)
+
+
+class RecipeStatsHourlyAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipe',
+        'hour',
+        'favorites',
+        'shopping_carts',
+    )
+    list_filter = ('hour',)
+    raw_id_fields = ('recipe',)
+
+
+class RecipeStatsDailyAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipe',
+        'day',
+        'favorites',
+        'shopping_carts',
+    )
+    list_filter = ('day',)
+    raw_id_fields = ('recipe',)
+
+
+class AuthorStatsDailyAdmin(admin.ModelAdmin):
+    list_display = (
+        'author',
+        'day',
+        'favorites',
+        'shopping_carts',
+        'followers',
+    )
+    list_filter = ('day',)
+    raw_id_fields = ('author',)
+
+
+class WatermarkAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'last_id',
+    )
+
+
+admin.site.register(RecipeStatsHourly, RecipeStatsHourlyAdmin)
+admin.site.register(RecipeStatsDaily, RecipeStatsDailyAdmin)
+admin.site.register(AuthorStatsDaily, AuthorStatsDailyAdmin)
+admin.site.register(Watermark, WatermarkAdmin)
@@ -0,0 +1,36 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from stats.rollup import BATCH_SIZE, prune_hourly, rollup
+
+
+class Command(BaseCommand):
+    help = ('Учёт новых добавлений в избранное, список покупок и подписок '
+            'в таблицах статистики.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Повторять каждые SECONDS секунд.')
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            totals = rollup(options['batch_size'])
+            pruned = prune_hourly()
+            if any(totals.values()) or pruned or not options['loop']:
+                self.stdout.write(
+                    'Учтено событий: ' + ', '.join(
+                        f'{name} {count}' for name, count in totals.items()
+                    ) + f'; удалено почасовых строк: {pruned}'
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def stop(self, *args):
+        self.running = False
@@ -0,0 +1,118 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+# Источник статистики → таблица событий (stats.rollup.SOURCES).
+SOURCES = {
+    'favorite': ('recipes', 'Favorite'),
+    'shopping_cart': ('recipes', 'ShoppingCart'),
+    'subscription': ('users', 'Subscriptions'),
+}
+
+
+def start_watermarks(apps, schema_editor):
+    # У событий до миграции нет настоящего времени создания: статистика
+    # считает только новые события.
+    Watermark = apps.get_model('stats', 'Watermark')
+    Watermark.objects.bulk_create(
+        Watermark(
+            name=name,
+            last_id=apps.get_model(*model).objects.aggregate(
+                last_id=Max('id')
+            )['last_id'] or 0,
+        )
+        for name, model in SOURCES.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('recipes', '0010_created_at'),
+        ('users', '0003_subscriptions_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Источник')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний учтённый id')),
+            ],
+            options={
+                'verbose_name': 'Отметка статистики',
+                'verbose_name_plural': 'Отметки статистики',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.PositiveIntegerField(default=0, verbose_name='Добавлений в список покупок')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_hourly', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Статистика рецепта за час',
+                'verbose_name_plural': 'Статистика рецептов по часам',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.PositiveIntegerField(default=0, verbose_name='Добавлений в список покупок')),
+                ('day', models.DateField(verbose_name='День')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_daily', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Статистика рецепта за день',
+                'verbose_name_plural': 'Статистика рецептов по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuthorStatsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.PositiveIntegerField(default=0, verbose_name='Добавлений в список покупок')),
+                ('day', models.DateField(verbose_name='День')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Новых подписчиков')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_daily', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора за день',
+                'verbose_name_plural': 'Статистика авторов по дням',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipestatshourly',
+            index=models.Index(fields=['hour'], name='recipe_stats_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipestatshourly',
+            constraint=models.UniqueConstraint(fields=('recipe', 'hour'), name='unique_recipe_stats_hour'),
+        ),
+        migrations.AddIndex(
+            model_name='recipestatsdaily',
+            index=models.Index(fields=['day'], name='recipe_stats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipestatsdaily',
+            constraint=models.UniqueConstraint(fields=('recipe', 'day'), name='unique_recipe_stats_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='authorstatsdaily',
+            constraint=models.UniqueConstraint(fields=('author', 'day'), name='unique_author_stats_day'),
+        ),
+        migrations.RunPython(start_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class RecipeCounters(models.Model):
+    favorites = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в избранное'
+    )
+    shopping_carts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в список покупок'
+    )
+
+    class Meta:
+        abstract = True
+
+
+class RecipeStatsHourly(RecipeCounters):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='stats_hourly',
+        verbose_name='Рецепт'
+    )
+    hour = models.DateTimeField(verbose_name='Час')
+
+    class Meta:
+        verbose_name = 'Статистика рецепта за час'
+        verbose_name_plural = 'Статистика рецептов по часам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'hour'),
+                name='unique_recipe_stats_hour'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('hour',), name='recipe_stats_hour_idx'),
+        ]
+
+
+class RecipeStatsDaily(RecipeCounters):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='stats_daily',
+        verbose_name='Рецепт'
+    )
+    day = models.DateField(verbose_name='День')
+
+    class Meta:
+        verbose_name = 'Статистика рецепта за день'
+        verbose_name_plural = 'Статистика рецептов по дням'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'day'),
+                name='unique_recipe_stats_day'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('day',), name='recipe_stats_day_idx'),
+        ]
+
+
+class AuthorStatsDaily(RecipeCounters):
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats_daily',
+        verbose_name='Автор'
+    )
+    day = models.DateField(verbose_name='День')
+    followers = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Новых подписчиков'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора за день'
+        verbose_name_plural = 'Статистика авторов по дням'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('author', 'day'),
+                name='unique_author_stats_day'
+            )
+        ]
+
+
+class Watermark(models.Model):
+    """
+    Последний учтённый в статистике первичный ключ таблицы событий.
+    """
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Источник'
+    )
+    last_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последний учтённый id'
+    )
+
+    class Meta:
+        verbose_name = 'Отметка статистики'
+        verbose_name_plural = 'Отметки статистики'
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
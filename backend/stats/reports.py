@@ -0,0 +1,81 @@
+"""
+Чтение статистики только из таблиц агрегатов (см. stats/rollup.py).
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import AuthorStatsDaily, RecipeStatsDaily, RecipeStatsHourly
+from .rollup import truncate_hour
+
+WINDOW_RE = re.compile(r'(\d+)([hd])')
+WINDOW_UNITS = {'h': 'hours', 'd': 'days'}
+MAX_WINDOW = timedelta(days=365)
+COUNTERS = ('favorites', 'shopping_carts')
+
+
+def parse_window(value):
+    """
+    Окно вида «24h» или «7d». None, если формат неверный или окно
+    пустое либо длиннее MAX_WINDOW.
+    """
+    match = WINDOW_RE.fullmatch(value.strip())
+    if match is None:
+        return None
+    window = timedelta(**{WINDOW_UNITS[match[2]]: int(match[1])})
+    if not timedelta(0) < window <= MAX_WINDOW:
+        return None
+    return window
+
+
+def trending(window, limit):
+    """
+    Рецепты с наибольшим числом добавлений в избранное и список покупок
+    за окно: [(recipe_id, favorites, shopping_carts)]. Окна короче срока
+    хранения почасовой статистики считаются по часам, остальные по дням.
+    """
+    start = timezone.now() - window
+    if window < timedelta(hours=settings.STATS_HOURLY_RETENTION_HOURS):
+        rows = RecipeStatsHourly.objects.filter(
+            hour__gte=truncate_hour(start)
+        )
+    else:
+        rows = RecipeStatsDaily.objects.filter(day__gt=start.date())
+    return list(rows.values('recipe_id').annotate(
+        favorites_total=Sum('favorites'),
+        shopping_carts_total=Sum('shopping_carts'),
+        score=Sum('favorites') + Sum('shopping_carts'),
+    ).order_by('-score', '-recipe_id').values_list(
+        'recipe_id', 'favorites_total', 'shopping_carts_total'
+    )[:limit])
+
+
+def author_stats(author_id, days):
+    """
+    Добавления рецептов автора в избранное и список покупок и новые
+    подписчики за последние days дней: итоги и ряд по дням.
+    """
+    today = timezone.now().date()
+    start = today - timedelta(days=days - 1)
+    fields = (*COUNTERS, 'followers')
+    rows = {
+        row['day']: row for row in AuthorStatsDaily.objects.filter(
+            author_id=author_id, day__gte=start
+        ).values('day', *fields)
+    }
+    daily = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day) or dict.fromkeys(fields, 0)
+        daily.append({'day': day, **{name: row[name] for name in fields}})
+    return {
+        'start': start,
+        'end': today,
+        'totals': {
+            name: sum(row[name] for row in daily) for name in fields
+        },
+        'daily': daily,
+    }
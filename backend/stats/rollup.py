@@ -0,0 +1,172 @@
+"""
+Инкрементальная агрегация событий в таблицы статистики.
+
+События — строки Favorite, ShoppingCart и Subscriptions со временем
+создания. Для каждой таблицы в Watermark хранится последний учтённый
+id; проход берёт только более новые строки, считает их по часам и дням
+и прибавляет к счётчикам RecipeStatsHourly, RecipeStatsDaily и
+AuthorStatsDaily. Счётчики и отметка меняются в одной транзакции, поэтому
+событие учитывается ровно один раз, даже если проход прервался.
+
+Последовательности id выдаются до фиксации транзакций, и строка с
+меньшим id может стать видна позже строки с большим. Поэтому события
+моложе lag не берутся, а выборка обрывается на первом таком событии:
+отметка не перепрыгивает через ещё не зафиксированные строки.
+
+Отметки начинаются с последних id на момент миграции: у строк,
+созданных раньше, нет настоящего времени создания.
+
+Удаление из избранного, списка покупок и отписка счётчики не уменьшают:
+статистика считает добавления.
+"""
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscriptions
+
+from .models import (
+    AuthorStatsDaily,
+    RecipeStatsDaily,
+    RecipeStatsHourly,
+    Watermark,
+)
+
+BATCH_SIZE = 5000
+
+# Таблица событий, счётчик в статистике и пути к автору и рецепту.
+Source = namedtuple('Source', ('model', 'counter', 'author', 'recipe'))
+
+SOURCES = {
+    'favorite': Source(
+        Favorite, 'favorites', 'recipe__author_id', 'recipe_id'
+    ),
+    'shopping_cart': Source(
+        ShoppingCart, 'shopping_carts', 'recipe__author_id', 'recipe_id'
+    ),
+    'subscription': Source(
+        Subscriptions, 'followers', 'author_id', None
+    ),
+}
+
+
+def truncate_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def pending(model, last_id, cutoff):
+    """
+    События после last_id, созданные раньше cutoff, без пропусков:
+    выборка обрывается на первом событии не старше cutoff.
+    """
+    events = model.objects.filter(id__gt=last_id).order_by('id')
+    newer = events.filter(created_at__gte=cutoff).values_list(
+        'id', flat=True
+    ).first()
+    if newer is not None:
+        events = events.filter(id__lt=newer)
+    return events
+
+
+def merge(model, keys, counter, counts):
+    """
+    Прибавление counts {(ключ1, ключ2): n} к полю counter строк model
+    с ключевыми полями keys; недостающие строки создаются.
+    """
+    if not counts:
+        return
+    counts = dict(counts)
+    first, second = keys
+    rows = model.objects.filter(**{
+        f'{first}__in': {key[0] for key in counts},
+        f'{second}__in': {key[1] for key in counts},
+    })
+    updated = []
+    for row in rows:
+        added = counts.pop((getattr(row, first), getattr(row, second)), 0)
+        if added:
+            setattr(row, counter, getattr(row, counter) + added)
+            updated.append(row)
+    model.objects.bulk_update(updated, (counter,))
+    model.objects.bulk_create(
+        model(**{first: key[0], second: key[1], counter: added})
+        for key, added in counts.items()
+    )
+
+
+def rollup_source(source, watermark, cutoff, batch_size):
+    """
+    Учёт не больше batch_size событий источника. Возвращает количество
+    учтённых событий.
+    """
+    fields = ['id', 'created_at', source.author]
+    if source.recipe is not None:
+        fields.append(source.recipe)
+    events = list(pending(
+        source.model, watermark.last_id, cutoff
+    ).values_list(*fields)[:batch_size])
+    if not events:
+        return 0
+    hourly, daily, authors = Counter(), Counter(), Counter()
+    for _, created_at, author_id, *recipe in events:
+        day = created_at.date()
+        authors[author_id, day] += 1
+        if recipe:
+            hourly[recipe[0], truncate_hour(created_at)] += 1
+            daily[recipe[0], day] += 1
+    merge(AuthorStatsDaily, ('author_id', 'day'), source.counter, authors)
+    merge(RecipeStatsHourly, ('recipe_id', 'hour'), source.counter, hourly)
+    merge(RecipeStatsDaily, ('recipe_id', 'day'), source.counter, daily)
+    watermark.last_id = events[-1][0]
+    watermark.save(update_fields=('last_id',))
+    return len(events)
+
+
+def rollup_batch(cutoff, batch_size=BATCH_SIZE):
+    """
+    Один проход по всем источникам в одной транзакции. Отметки
+    блокируются, поэтому параллельные проходы выполняются по очереди.
+    Возвращает {источник: учтено событий}.
+    """
+    Watermark.objects.bulk_create(
+        (Watermark(name=name) for name in SOURCES), ignore_conflicts=True
+    )
+    with transaction.atomic():
+        watermarks = Watermark.objects.select_for_update().filter(
+            name__in=SOURCES
+        ).order_by('name').in_bulk(field_name='name')
+        return {
+            name: rollup_source(source, watermarks[name], cutoff, batch_size)
+            for name, source in SOURCES.items()
+        }
+
+
+def rollup(batch_size=BATCH_SIZE, lag=None):
+    """
+    Учёт всех событий старше lag (по умолчанию STATS_ROLLUP_LAG_SECONDS)
+    проходами по batch_size. Возвращает {источник: учтено событий}.
+    """
+    if lag is None:
+        lag = timedelta(seconds=settings.STATS_ROLLUP_LAG_SECONDS)
+    cutoff = timezone.now() - lag
+    totals = Counter({name: 0 for name in SOURCES})
+    while True:
+        processed = rollup_batch(cutoff, batch_size)
+        totals.update(processed)
+        if max(processed.values()) < batch_size:
+            return dict(totals)
+
+
+def prune_hourly(retention=None):
+    """
+    Удаление почасовой статистики старше retention (по умолчанию
+    STATS_HOURLY_RETENTION_HOURS): дальше окна считаются по дням.
+    """
+    if retention is None:
+        retention = timedelta(hours=settings.STATS_HOURLY_RETENTION_HOURS)
+    before = truncate_hour(timezone.now() - retention)
+    return RecipeStatsHourly.objects.filter(hour__lt=before).delete()[0]
@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'id',
+        'status',
+        'attempts',
+        'run_after',
+        'created',
+    )
+    list_filter = (
+        'status',
+        'name',
+    )
+
+
+admin.site.register(Task, TaskAdmin)
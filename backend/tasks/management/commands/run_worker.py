@@ -0,0 +1,62 @@
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks.worker import claim, prune, run_task
+
+# Как часто воркер удаляет старые выполненные задачи, секунд.
+PRUNE_INTERVAL = 3600
+
+POOLS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+class Command(BaseCommand):
+    help = 'Выполнение фоновых задач из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', choices=POOLS, default='thread')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--batch', type=int, default=20)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # Дочерние процессы не должны наследовать открытые соединения.
+        connections.close_all()
+        pool = POOLS[options['pool']](max_workers=options['concurrency'])
+        pruned_at = 0
+        with pool:
+            while self.running:
+                if time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    pruned = prune()
+                    if pruned:
+                        self.stdout.write(
+                            f'Удалено выполненных задач: {pruned}'
+                        )
+                ids = claim(options['batch'])
+                if options['pool'] == 'process':
+                    connections.close_all()
+                if ids:
+                    results = list(pool.map(run_task, ids))
+                    self.stdout.write(
+                        f'Выполнено задач: {sum(results)}, '
+                        f'с ошибкой: {len(results) - sum(results)}'
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+    def stop(self, *args):
+        self.running = False
@@ -0,0 +1,76 @@
+"""
+Регистрация и постановка фоновых задач в очередь.
+
+    @task
+    def fan_out_recipe(recipe_id): ...
+
+    enqueue_on_commit(fan_out_recipe, recipe.id,
+                      idempotency_key=f'fan_out:{recipe.id}')
+
+Аргументы задач сохраняются в JSON, поэтому передавать нужно
+идентификаторы, а не объекты моделей.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Task
+
+_registry = {}
+
+
+def task(func):
+    """
+    Регистрация функции как фоновой задачи.
+    """
+    _registry[f'{func.__module__}.{func.__name__}'] = func
+    return func
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def task_name(func):
+    return func if isinstance(func, str) else (
+        f'{func.__module__}.{func.__name__}'
+    )
+
+
+def enqueue(func, *args, idempotency_key=None, delay=0, max_attempts=None,
+            **kwargs):
+    """
+    Постановка задачи в очередь. Задача с уже встречавшимся ключом
+    идемпотентности повторно не ставится; выполненные задачи помнятся
+    TASKS_DONE_RETENTION_DAYS дней (см. tasks.worker.prune).
+    При TASKS_ALWAYS_EAGER задача выполняется сразу.
+    """
+    name = task_name(func)
+    if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+        get_task(name)(*args, **kwargs)
+        return None
+    fields = {
+        'name': name,
+        'args': list(args),
+        'kwargs': kwargs,
+        'idempotency_key': idempotency_key,
+        'run_after': timezone.now() + timedelta(seconds=delay),
+    }
+    if max_attempts is not None:
+        fields['max_attempts'] = max_attempts
+    if idempotency_key is None:
+        return Task.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Task.objects.create(**fields)
+    except IntegrityError:
+        return None
+
+
+def enqueue_on_commit(func, *args, **kwargs):
+    """
+    Постановка задачи в очередь после фиксации текущей транзакции.
+    """
+    transaction.on_commit(lambda: enqueue(func, *args, **kwargs))
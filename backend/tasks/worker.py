@@ -0,0 +1,101 @@
+"""
+Выполнение задач из очереди.
+
+Задачи забираются пачками через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+несколько воркеров могут работать с одной очередью. Упавшая задача
+повторяется с экспоненциальной задержкой, пока не исчерпает max_attempts.
+Задачи, зависшие в статусе «Выполняется» дольше TASKS_LOCK_TIMEOUT
+секунд (например, после падения воркера), забираются повторно.
+Выполненные задачи с ключом идемпотентности хранятся
+TASKS_DONE_RETENTION_DAYS дней (prune()).
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 2
+BACKOFF_MAX = 3600
+
+
+def claim(batch_size):
+    """
+    Захват до batch_size готовых к выполнению задач.
+    Возвращает их идентификаторы.
+    """
+    now = timezone.now()
+    lock_timeout = timedelta(
+        seconds=getattr(settings, 'TASKS_LOCK_TIMEOUT', 600)
+    )
+    with transaction.atomic():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Task.PENDING, run_after__lte=now)
+                | Q(status=Task.RUNNING, locked_at__lt=now - lock_timeout)
+            ).order_by('run_after', 'id').values_list('id', flat=True)[
+                :batch_size
+            ]
+        )
+        Task.objects.filter(id__in=ids).update(
+            status=Task.RUNNING,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return ids
+
+
+def prune(retention=None):
+    """
+    Удаление выполненных задач, взятых в работу раньше retention назад
+    (по умолчанию TASKS_DONE_RETENTION_DAYS дней). После этого задача с
+    тем же ключом идемпотентности может быть поставлена снова.
+    """
+    if retention is None:
+        retention = timedelta(days=settings.TASKS_DONE_RETENTION_DAYS)
+    return Task.objects.filter(
+        status=Task.DONE, locked_at__lt=timezone.now() - retention
+    ).delete()[0]
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE ** attempts, BACKOFF_MAX))
+
+
+def run_task(task_id):
+    """
+    Выполнение одной задачи. Выполненная задача без ключа
+    идемпотентности удаляется, с ключом — остаётся до prune(), чтобы
+    повторная постановка с тем же ключом была проигнорирована.
+    """
+    close_old_connections()
+    try:
+        task = Task.objects.get(id=task_id)
+        try:
+            get_task(task.name)(*task.args, **task.kwargs)
+        except Exception:
+            logger.exception('Задача %s (%s) завершилась с ошибкой',
+                             task.name, task.id)
+            task.last_error = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                task.status = Task.FAILED
+            else:
+                task.status = Task.PENDING
+                task.run_after = timezone.now() + backoff(task.attempts)
+            task.save(update_fields=('status', 'run_after', 'last_error'))
+            return False
+        if task.idempotency_key is None:
+            task.delete()
+        else:
+            Task.objects.filter(id=task.id).update(status=Task.DONE)
+        return True
+    finally:
+        close_old_connections()
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
 from django.core.exceptions import ValidationError
 
+from recipes.deletion import delete_user
 from .models import Subscriptions
 
 admin.site.unregister(User)
@@ -21,6 +22,13 @@ class CustomUserAdmin(UserAdmin):
         'first_name',
     )
 
+    def delete_model(self, request, obj):
+        delete_user(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset.iterator():
+            delete_user(user)
+
 
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = (
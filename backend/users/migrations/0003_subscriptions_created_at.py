@@ -0,0 +1,20 @@
+# Generated by Django 3.2.15 on 2026-10-19 12:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_subscriptions_users_subscriptions_no_self_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptions',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+    ]
@@ -18,6 +18,10 @@ class Subscriptions(models.Model):
         related_name='following',
         verbose_name='Автор'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     def clean(self):
         if self.user == self.author:
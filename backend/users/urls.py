@@ -1,7 +1,13 @@
-from django.urls import include, path
+from django.urls import re_path
+from djoser.views import TokenCreateView, TokenDestroyView
 
 app_name = 'users'
 
+# Маршруты djoser.urls.authtoken без импорта пакета djoser.urls, который
+# строит роутер со всеми представлениями djoser.
 urlpatterns = [
-    path('auth/', include('djoser.urls.authtoken')),
+    re_path(r'^auth/token/login/?$', TokenCreateView.as_view(),
+            name='login'),
+    re_path(r'^auth/token/logout/?$', TokenDestroyView.as_view(),
+            name='logout'),
 ]
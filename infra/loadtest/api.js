@@ -0,0 +1,29 @@
+// Нагрузочный тест анонимных GET-запросов к API через nginx.
+// Запуск: см. раздел «Нагрузочный тест» в README.md.
+import http from 'k6/http';
+import { check } from 'k6';
+
+const BASE_URL = __ENV.BASE_URL || 'http://nginx';
+
+const PATHS = [
+  '/api/recipes/?page=1&limit=6',
+  '/api/recipes/?page=2&limit=6',
+  '/api/tags/',
+  '/api/ingredients/?name=%D1%81',
+];
+
+export const options = {
+  vus: Number(__ENV.VUS || 50),
+  duration: __ENV.DURATION || '30s',
+  summaryTrendStats: ['avg', 'p(50)', 'p(95)', 'p(99)', 'max'],
+};
+
+export default function () {
+  const responses = http.batch(PATHS.map((path) => [
+    'GET', `${BASE_URL}${path}`, null,
+    { headers: { 'Accept-Encoding': 'gzip' } },
+  ]));
+  responses.forEach((response) => {
+    check(response, { 'status 200': (r) => r.status === 200 });
+  });
+}